@@ -1,277 +1,477 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import requests
-from bs4 import BeautifulSoup
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, TimeoutError as FuturesTimeoutError
+from functools import partial
+import json
+import os
+import sqlite3
+import time
+
+import http_client
+from catalog import Catalog
+from metrics import Registry
+from extraction import SITE_SPECS, SPECS_BY_NAME, extract_products, search_url, within_budget
+from prefetch import Prefetcher
+from search_cache import SearchCache, normalize_query
+from site_health import SiteHealthRegistry
 
 app = Flask(__name__)
 CORS(app)
 
+# Per-request HTTP timeout for a single retailer (seconds)
+REQUEST_TIMEOUT = 15
+# Overall budget for one /search; sites that haven't answered by then are reported as timed out
+SEARCH_DEADLINE = 10
+# Shared pool for the per-site scrapers (3 sites x a few concurrent searches)
+scrape_executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix='scraper')
+# Result cache for /search: fresh for 10 min, then served stale (and refreshed) for 30 min more.
+# Results with a failed or timed-out site are only kept for a minute.
+CACHE_PARTIAL_TTL = 60
+search_cache = SearchCache(ttl=600, stale_ttl=1800, max_entries=2000, max_bytes=64 * 1024 * 1024)
+# Per-site circuit breakers: 3 failures in a row skip the site for 30s (up to 5 min while probes
+# keep failing); timeouts follow 2x the site's p95 latency, between 2s and REQUEST_TIMEOUT
+site_health = SiteHealthRegistry(failure_threshold=3, cooldown=30, max_cooldown=300, min_timeout=2.0, max_timeout=REQUEST_TIMEOUT)
+# Opt-in ("prefetch": true) background load of page N+1 after serving page N: two workers,
+# at most 20 prefetched pages outstanding, dropped if not requested within 5 min
+PREFETCH_MAX_PAGE = 10
+prefetcher = Prefetcher(max_workers=2, budget=20, expire_after=300)
+# Local catalog of every scraped product and of what each site listed per (query, page). "mode": "catalog"
+# replays that listing when the page was scraped live by every site within CATALOG_MAX_AGE, and
+# otherwise answers from the full-text index over products seen within CATALOG_MAX_AGE (CATALOG_PAGE_SIZE
+# per page); writes go through one background thread.
+CATALOG_PATH = os.environ.get('CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.db'))
+CATALOG_MAX_AGE = 6 * 3600
+CATALOG_PAGE_SIZE = 60
+try:
+    catalog = Catalog(CATALOG_PATH)
+except sqlite3.Error as e:
+    # e.g. an SQLite build without FTS5; everything else works without the catalog
+    print(f"[PythonBackend] Product catalog disabled: {e}")
+    catalog = None
+catalog_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog')
+# /search/batch: up to 100 items, fetched on their own pool so batch jobs can't starve interactive
+# searches, all within one overall deadline
+MAX_BATCH_ITEMS = 100
+BATCH_DEADLINE = 60
+batch_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix='batch-scraper')
+
+# Metrics served on /metrics (Prometheus text format)
+metrics = Registry()
+PHASE_SECONDS = metrics.histogram('scraper_phase_seconds', 'Time per hot-path phase (fetch, parse, extract per site; serialize per response)', ['site', 'phase'])
+SITE_SECONDS = metrics.histogram('scraper_site_seconds', 'Total time of one site scrape by outcome', ['site', 'outcome'])
+BYTES_DOWNLOADED = metrics.counter('scraper_bytes_downloaded_total', 'Response body bytes received from retailers (compressed, as sent on the wire)', ['site'])
+ITEMS_FOUND = metrics.counter('scraper_items_found_total', 'Product containers matched on result pages', ['site'])
+ITEMS_EXTRACTED = metrics.counter('scraper_items_extracted_total', 'Containers that yielded a product (title and link)', ['site'])
+SITE_RESULTS = metrics.counter('scraper_site_results_total', 'Per-site results of /search fan-outs by status', ['site', 'status'])
+SEARCH_SECONDS = metrics.histogram('search_request_seconds', 'Search request latency', ['endpoint'])
+SEARCH_REQUESTS = metrics.counter('search_requests_total', 'Search requests by how they were answered', ['endpoint', 'source'])
+CACHE_EVENTS = metrics.counter('search_cache_events_total', 'Search cache lookups and maintenance', ['event'])
+CACHE_ENTRIES = metrics.gauge('search_cache_entries', 'Entries in the search cache')
+CACHE_BYTES = metrics.gauge('search_cache_bytes', 'Approximate size of the search cache')
+CACHE_HIT_RATIO = metrics.gauge('search_cache_hit_ratio', 'Share of cache lookups answered from the cache')
+PREFETCH_EVENTS = metrics.counter('prefetch_events_total', 'Next-page prefetches by outcome', ['event'])
+PREFETCH_PENDING = metrics.gauge('prefetch_pending', 'Prefetches queued, running or awaiting use')
+PREFETCH_HIT_RATIO = metrics.gauge('prefetch_hit_ratio', 'Share of resolved prefetches that a request used')
+SITE_UP = metrics.gauge('scraper_site_up', '1 while the site circuit is closed, 0 when open or half-open', ['site'])
+SITE_TIMEOUT = metrics.gauge('scraper_site_timeout_seconds', 'Current adaptive request timeout', ['site'])
+CATALOG_PRODUCTS = metrics.gauge('catalog_products', 'Products in the local catalog', ['source'])
+
 # Scraper functions
-def extract_price(price_text):
-    """Extract numeric price from text"""
+def scrape_site(spec, query, max_price, page=1, timeout=REQUEST_TIMEOUT):
+    """
+    Fetch one results page for a site spec, catalog everything extracted and return what fits the budget
+    (everything when max_price is None).
+    Outcomes feed the site's circuit breaker: errors and pages where nothing was extracted count as failures;
+    running out of our own rate-limit tokens doesn't.
+    """
+    site = spec['name']
+    health = site_health[site]
+    stats = {}
+    started = time.monotonic()
     try:
-        price_text = re.sub(r'[₹,]', '', price_text)
-        match = re.search(r'\d+', price_text)
-        if match:
-            return int(match.group())
-    except:
-        pass
-    return None
+        response = http_client.get(search_url(spec, query, page), timeout=timeout)
+        fetch_s = response.fetch_s
+        PHASE_SECONDS.observe(fetch_s, site=site, phase='fetch')
+        BYTES_DOWNLOADED.inc(http_client.wire_bytes(response), site=site)
+        response.raise_for_status()
+        extracted = extract_products(spec, response.content, stats=stats)
+    except http_client.RateLimitExceeded as e:
+        health.record_throttled()
+        SITE_SECONDS.observe(time.monotonic() - started, site=site, outcome='throttled')
+        print(f"Error scraping {site}: {e}")
+        raise
+    except Exception as e:
+        health.record_failure(str(e))
+        SITE_SECONDS.observe(time.monotonic() - started, site=site, outcome='error')
+        print(f"Error scraping {site}: {e}")
+        raise
+    PHASE_SECONDS.observe(stats['parse_s'], site=site, phase='parse')
+    PHASE_SECONDS.observe(stats['extract_s'], site=site, phase='extract')
+    ITEMS_FOUND.inc(stats['found'], site=site)
+    ITEMS_EXTRACTED.inc(stats['extracted'], site=site)
+    if catalog is not None:
+        catalog_writer.submit(catalog.record_page, query, page, site, extracted)
+    if not extracted:
+        health.record_failure('no products extracted', empty=True)
+        SITE_SECONDS.observe(time.monotonic() - started, site=site, outcome='empty')
+        return []
+    health.record_success(fetch_s)
+    SITE_SECONDS.observe(time.monotonic() - started, site=site, outcome='ok')
+    if max_price is None:
+        return extracted
+    return [product for product in extracted if within_budget(spec, product, max_price)]
 
-def scrape_flipkart(query, max_price, page=1):
-    """Scrape Flipkart with multiple selector patterns"""
-    products = []
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    }
-    
-    search_query = query.replace(' ', '%20')
-    url = f'https://www.flipkart.com/search?q={search_query}&page={page}'
-    
+def scrape_flipkart(query, max_price, page=1, timeout=REQUEST_TIMEOUT):
+    """Scrape Flipkart"""
+    return scrape_site(SPECS_BY_NAME['Flipkart'], query, max_price, page, timeout)
+
+def scrape_amazon(query, max_price, page=1, timeout=REQUEST_TIMEOUT):
+    """Scrape Amazon India"""
+    return scrape_site(SPECS_BY_NAME['Amazon'], query, max_price, page, timeout)
+
+def scrape_myntra(query, max_price, page=1, timeout=REQUEST_TIMEOUT):
+    """Scrape Myntra"""
+    return scrape_site(SPECS_BY_NAME['Myntra'], query, max_price, page, timeout)
+
+# One scraper per site spec; adding a retailer only needs a new entry in extraction.SITE_SPECS
+SCRAPERS = [(spec['name'], partial(scrape_site, spec)) for spec in SITE_SPECS]
+SITE_ORDER = {name: i for i, (name, _) in enumerate(SCRAPERS)}
+
+def run_scraper(scraper, query, max_price, page, timeout):
+    """Run one site scraper; return (products, elapsed milliseconds)"""
+    started = time.monotonic()
+    products = scraper(query, max_price, page, timeout)
+    return products, int((time.monotonic() - started) * 1000)
+
+def iter_site_results(query, max_price, page=1, deadline=None):
+    """Scrape all sites concurrently, yielding (site, status, products) as each one finishes or times out"""
+    if deadline is None:
+        deadline = SEARCH_DEADLINE
+    futures = {}
+    skipped = []
+    for name, scraper in SCRAPERS:
+        health = site_health[name]
+        if not health.allow_request():
+            skipped.append(name)
+            continue
+        timeout = min(health.timeout(), deadline)
+        futures[scrape_executor.submit(run_scraper, scraper, query, max_price, page, timeout)] = name
+    for name in skipped:
+        print(f"[PythonBackend] Skipping {name}: circuit open")
+        SITE_RESULTS.inc(site=name, status='skipped')
+        yield name, {'status': 'skipped', 'count': 0, 'error': 'circuit open'}, []
     try:
-        response = requests.get(url, headers=headers, timeout=15)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Try multiple selector patterns (Flipkart changes HTML frequently)
-        items = soup.find_all('div', {'class': '_1AtVbE'})[:20]
-        if not items:
-            items = soup.find_all('div', {'class': '_2kHMtA'})[:20]
-        if not items:
-            items = soup.find_all('div', {'class': '_1YokD2'})[:20]
-        
-        for item in items:
+        for future in as_completed(futures, timeout=deadline):
+            name = futures[future]
             try:
-                # Try multiple title selectors
-                title_elem = item.find('a', {'class': 's1Q9rs'})
-                if not title_elem:
-                    title_elem = item.find('a', {'class': 'IRpwTa'})
-                if not title_elem:
-                    title_elem = item.find('a', {'class': '_2UzuFa'})
-                if not title_elem:
-                    title_elem = item.find('div', {'class': '_4rR01T'})
-                
-                # Try multiple price selectors
-                price_elem = item.find('div', {'class': '_30jeq3'})
-                if not price_elem:
-                    price_elem = item.find('div', {'class': '_25b18c'})
-                if not price_elem:
-                    price_elem = item.find('div', {'class': '_1_WHN1'})
-                
-                # Try multiple image selectors
-                image_elem = item.find('img', {'class': '_396cs4'})
-                if not image_elem:
-                    image_elem = item.find('img', {'class': '_2r_T1I'})
-                if not image_elem:
-                    image_elem = item.find('img')
-                
-                if title_elem and price_elem:
-                    title = title_elem.text.strip() if hasattr(title_elem, 'text') else title_elem.get_text(strip=True)
-                    price_text = price_elem.text.strip() if hasattr(price_elem, 'text') else price_elem.get_text(strip=True)
-                    price = extract_price(price_text)
-                    
-                    if price and price <= max_price:
-                        href = title_elem.get('href', '') if title_elem.name == 'a' else ''
-                        if not href and title_elem.find('a'):
-                            href = title_elem.find('a').get('href', '')
-                        link = 'https://www.flipkart.com' + href if href else ''
-                        image = image_elem.get('src', '') if image_elem else image_elem.get('data-src', '')
-                        
-                        if title and link:
-                            products.append({
-                                'title': title,
-                                'price': f'₹{price}',
-                                'link': link,
-                                'image': image,
-                                'source': 'Flipkart'
-                            })
+                site_products, site_ms = future.result()
             except Exception as e:
+                print(f"[PythonBackend] {name} scraping error: {e}")
+                SITE_RESULTS.inc(site=name, status='error')
+                yield name, {'status': 'error', 'count': 0, 'error': str(e)}, []
                 continue
-    
-    except Exception as e:
-        print(f"Error scraping Flipkart: {e}")
-    
-    return products
+            print(f"[PythonBackend] Found {len(site_products)} products from {name}")
+            SITE_RESULTS.inc(site=name, status='ok')
+            yield name, {'status': 'ok', 'count': len(site_products), 'elapsed_ms': site_ms}, site_products
+    except FuturesTimeoutError:
+        for future, name in futures.items():
+            if not future.done():
+                # Leave it running in the pool; its own request timeout bounds how long
+                future.cancel()
+                print(f"[PythonBackend] {name} did not finish within {deadline}s")
+                SITE_RESULTS.inc(site=name, status='timeout')
+                yield name, {'status': 'timeout', 'count': 0}, []
 
-def scrape_amazon(query, max_price, page=1):
-    """Scrape Amazon India with multiple selector patterns"""
+def scrape_all_sites(query, max_price, page=1, deadline=None):
+    """Scrape all sites concurrently; return (products, per-site status) for sites done by the deadline"""
+    print(f"[PythonBackend] Starting product scraping for query: '{query}' page {page} with max price: {max_price}")
+    started = time.monotonic()
     products = []
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    }
-    
-    search_query = query.replace(' ', '+')
-    url = f'https://www.amazon.in/s?k={search_query}&page={page}'
-    
-    try:
-        response = requests.get(url, headers=headers, timeout=15)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        items = soup.find_all('div', {'data-component-type': 's-search-result'})[:20]
-        if not items:
-            items = soup.find_all('div', {'class': 's-result-item'})[:20]
-        
-        for item in items:
-            try:
-                # Try multiple title selectors
-                title_elem = item.find('h2', {'class': 'a-size-mini'})
-                if not title_elem:
-                    title_elem = item.find('h2', {'class': 'a-size-base-plus'})
-                if not title_elem:
-                    title_elem = item.find('h2')
-                
-                # Try multiple price selectors
-                price_elem = item.find('span', {'class': 'a-price-whole'})
-                if not price_elem:
-                    price_elem = item.find('span', {'class': 'a-price'})
-                if not price_elem:
-                    price_elem = item.find('span', {'class': 'a-offscreen'})
-                
-                # Try multiple image selectors
-                image_elem = item.find('img', {'class': 's-image'})
-                if not image_elem:
-                    image_elem = item.find('img', {'data-image-latency': True})
-                if not image_elem:
-                    image_elem = item.find('img')
-                
-                # Try multiple link selectors
-                link_elem = item.find('a', {'class': 'a-link-normal'})
-                if not link_elem:
-                    link_elem = item.find('h2').find('a') if item.find('h2') else None
-                
-                if title_elem:
-                    title = title_elem.text.strip() if hasattr(title_elem, 'text') else title_elem.get_text(strip=True)
-                    price = None
-                    if price_elem:
-                        price_text = price_elem.text.strip() if hasattr(price_elem, 'text') else price_elem.get_text(strip=True)
-                        price = extract_price(price_text)
-                    
-                    # Accept products even without price if we have title and link
-                    if title:
-                        href = link_elem.get('href', '') if link_elem else ''
-                        link = 'https://www.amazon.in' + href if href and not href.startswith('http') else href
-                        image = image_elem.get('src', '') if image_elem else image_elem.get('data-src', '') if image_elem else ''
-                        
-                        if link:
-                            products.append({
-                                'title': title,
-                                'price': f'₹{price}' if price else 'Price on site',
-                                'link': link,
-                                'image': image,
-                                'source': 'Amazon'
-                            })
-            except Exception as e:
-                continue
-    
-    except Exception as e:
-        print(f"Error scraping Amazon: {e}")
+    sites = {}
+    for name, status, site_products in iter_site_results(query, max_price, page, deadline):
+        products.extend(site_products)
+        sites[name] = status
+    # Keep the response in SCRAPERS order whatever order the sites finished in
+    sites = {name: sites[name] for name, _ in SCRAPERS if name in sites}
+    products.sort(key=lambda product: SITE_ORDER.get(product['source'], len(SITE_ORDER)))
     
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    print(f"[PythonBackend] Total products found: {len(products)} in {elapsed_ms}ms")
+    return products, sites
+
+def scrape_products(query, max_price, page=1):
+    """Scrape products from multiple e-commerce sites"""
+    products, _ = scrape_all_sites(query, max_price, page)
     return products
 
-def scrape_myntra(query, max_price, page=1):
-    """Scrape Myntra"""
-    products = []
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    }
-    
-    search_query = query.replace(' ', '%20')
-    url = f'https://www.myntra.com/{search_query}'
-    
-    try:
-        response = requests.get(url, headers=headers, timeout=15)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Myntra product selectors
-        items = soup.find_all('li', {'class': 'product-base'})[:20]
-        if not items:
-            items = soup.find_all('div', {'class': 'product-productMetaInfo'})[:20]
-        
-        for item in items:
-            try:
-                title_elem = item.find('h3', {'class': 'product-brand'})
-                if not title_elem:
-                    title_elem = item.find('h4', {'class': 'product-product'})
-                if not title_elem:
-                    title_elem = item.find('a', {'class': 'product-productMetaInfo'})
-                
-                price_elem = item.find('span', {'class': 'product-discountedPrice'})
-                if not price_elem:
-                    price_elem = item.find('span', {'class': 'product-price'})
-                
-                image_elem = item.find('img', {'class': 'img-responsive'})
-                if not image_elem:
-                    image_elem = item.find('img')
-                
-                link_elem = item.find('a', {'href': True})
-                
-                if title_elem:
-                    title = title_elem.text.strip() if hasattr(title_elem, 'text') else title_elem.get_text(strip=True)
-                    price = None
-                    if price_elem:
-                        price_text = price_elem.text.strip() if hasattr(price_elem, 'text') else price_elem.get_text(strip=True)
-                        price = extract_price(price_text)
-                    
-                    if title:
-                        href = link_elem.get('href', '') if link_elem else ''
-                        link = 'https://www.myntra.com' + href if href and not href.startswith('http') else href
-                        image = image_elem.get('src', '') if image_elem else image_elem.get('data-src', '') if image_elem else ''
-                        
-                        if link and (not price or price <= max_price):
-                            products.append({
-                                'title': title,
-                                'price': f'₹{price}' if price else 'Price on site',
-                                'link': link,
-                                'image': image,
-                                'source': 'Myntra'
-                            })
-            except Exception as e:
-                continue
+def budget_to_max_price(budget):
+    """Map a ShopSwipe budget tier to its max price"""
+    if budget == 'budget-friendly':
+        return 1000
+    elif budget == 'mid-range':
+        return 3000
+    return float('inf')
+
+def result_ttl(products, sites):
+    """Cache TTL for a search result: default when complete, short when a site failed, none when empty"""
+    if not products:
+        return 0
+    if any(site['status'] != 'ok' for site in sites.values()):
+        return CACHE_PARTIAL_TTL
+    return None
+
+def record_live_search(query, page, sites):
+    """Note a live scrape every site answered so catalog mode may answer this page of the query for a while"""
+    if catalog is not None and sites and all(site['status'] == 'ok' for site in sites.values()):
+        catalog_writer.submit(catalog.record_search, query, page)
+
+def load_search(query, max_price, page=1):
+    """Live scrape as a cacheable {'products', 'sites'} result"""
+    products, sites = scrape_all_sites(query, max_price, page)
+    record_live_search(query, page, sites)
+    return {'products': products, 'sites': sites}
+
+def catalog_search(query, max_price, page=1):
+    """
+    Products for a search from the local catalog, budget-filtered per site like a live search: the
+    listing the last live scrape of this page returned when it is recent, else full-text matches over
+    recently seen products; None when the catalog can't answer (no recent listing, no matches)
+    """
+    if catalog is None:
+        return None
+    if catalog.is_fresh(query, page, CATALOG_MAX_AGE):
+        products = catalog.results(query, page)
+        products.sort(key=lambda product: SITE_ORDER.get(product['source'], len(SITE_ORDER)))
+    else:
+        products = catalog.search(
+            query,
+            max_price=max_price,
+            max_age=CATALOG_MAX_AGE,
+            limit=CATALOG_PAGE_SIZE,
+            offset=(page - 1) * CATALOG_PAGE_SIZE,
+            unfiltered_sources=[name for name, spec in SPECS_BY_NAME.items() if spec['price_filter'] is None]
+        )
+        if not products:
+            return None
+    return [product for product in products if within_budget(SPECS_BY_NAME[product['source']], product, max_price)]
+
+def cached_search(query, max_price, page=1):
+    """
+    scrape_all_sites behind the result cache; return ({'products', 'sites'}, cache status).
+    A cache miss takes a prefetched result when there is one (status 'prefetch').
+    """
+    key = SearchCache.make_key(query, max_price, page)
+    prefetched = False
     
-    except Exception as e:
-        print(f"Error scraping Myntra: {e}")
+    def load():
+        nonlocal prefetched
+        result = prefetcher.take(key, timeout=SEARCH_DEADLINE)
+        prefetched = result is not None
+        if result is None:
+            result = load_search(query, max_price, page)
+        return result, result_ttl(result['products'], result['sites'])
     
-    return products
+    result, status = search_cache.get_or_load(key, load)
+    if status == 'miss' and prefetched:
+        status = 'prefetch'
+    return result, status
 
-def scrape_products(query, max_price, page=1):
-    """Scrape products from multiple e-commerce sites"""
-    print(f"[PythonBackend] Starting product scraping for query: '{query}' page {page} with max price: {max_price}")
-    products = []
+def prefetch_next_page(query, max_price, page, result):
+    """Queue a background load of the page after `page` unless it is cached or can't exist"""
+    if not result['products'] or page >= PREFETCH_MAX_PAGE:
+        return False
+    key = SearchCache.make_key(query, max_price, page + 1)
+    if search_cache.contains(key):
+        return False
+    return prefetcher.schedule(key, partial(load_search, query, max_price, page + 1))
+
+def parse_search_request(data):
+    """(query, budget, page) from a /search request body"""
+    query = data.get('query', '')
+    budget = data.get('budget', 'budget-friendly')
+    page = int(data.get('page', 1))
+    if page < 1:
+        page = 1
+    return query, budget, page
+
+def stream_search_events(query, max_price, page=1, prefetch=False):
+    """
+    Yield one ('site', {...products}) event per retailer as it finishes, then ('summary', {...}).
+    A fresh cached or prefetched result is replayed per site, as is the result of an identical search
+    already in flight; otherwise sites stream live and the combined result is cached once the last
+    one is done.
+    """
+    key = SearchCache.make_key(query, max_price, page)
+    cached, cache_status = search_cache.claim(key)
+    loading = None
+    if cache_status == 'coalesced':
+        try:
+            cached = cached.result(timeout=2 * SEARCH_DEADLINE)
+        except Exception:
+            # The other load failed, was abandoned or is stuck: stream this search live on its own
+            cached, cache_status = None, 'miss'
+    elif cache_status == 'miss':
+        loading = cached
+        cached, cache_status = prefetcher.take(key, timeout=SEARCH_DEADLINE), 'prefetch'
+        if cached is not None:
+            search_cache.finish_load(key, loading, cached, result_ttl(cached['products'], cached['sites']))
+        else:
+            cache_status = 'miss'
+    if cached is not None:
+        for name, status in cached['sites'].items():
+            site_products = [product for product in cached['products'] if product['source'] == name]
+            yield 'site', dict(status, site=name, products=site_products)
+        if prefetch:
+            prefetch_next_page(query, max_price, page, cached)
+        yield 'summary', {'success': True, 'count': len(cached['products']), 'sites': cached['sites'], 'cache': cache_status}
+        return
     
+    print(f"[PythonBackend] Streaming product scraping for query: '{query}' page {page} with max price: {max_price}")
+    products = []
+    sites = {}
     try:
-        flipkart_products = scrape_flipkart(query, max_price, page)
-        products.extend(flipkart_products)
-        print(f"[PythonBackend] Found {len(flipkart_products)} products from Flipkart")
-    except Exception as e:
-        print(f"[PythonBackend] Flipkart scraping error: {e}")
+        for name, status, site_products in iter_site_results(query, max_price, page):
+            sites[name] = status
+            products.extend(site_products)
+            yield 'site', dict(status, site=name, products=site_products)
+    except BaseException as e:
+        # Includes the client going away (GeneratorExit): release whoever waits on this load
+        if loading is not None:
+            error = e if isinstance(e, Exception) else RuntimeError('Search stream closed before it finished')
+            search_cache.finish_load(key, loading, error=error)
+        raise
+    sites = {name: sites[name] for name, _ in SCRAPERS if name in sites}
+    products.sort(key=lambda product: SITE_ORDER.get(product['source'], len(SITE_ORDER)))
+    result = {'products': products, 'sites': sites}
+    if loading is not None:
+        search_cache.finish_load(key, loading, result, result_ttl(products, sites))
+    else:
+        search_cache.put(key, result, result_ttl(products, sites))
+    record_live_search(query, page, sites)
+    if prefetch:
+        prefetch_next_page(query, max_price, page, result)
+    yield 'summary', {'success': True, 'count': len(products), 'sites': sites, 'cache': 'miss'}
+
+def format_ndjson(event, payload):
+    return json.dumps(dict(payload, type=event), ensure_ascii=False) + '\n'
+
+def format_sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def batch_search(items, deadline=None):
+    """
+    Answer many (query, max_price, page) items with one fetch per distinct (site, query, page).
+    Items with a fresh cached result use it; the rest share unfiltered fetches (scheduled round-robin
+    across sites), get their own budget filter applied and are cached like single searches.
+    Returns (per-item {'products', 'sites', 'cache'} results in input order, fetch summary).
+    """
+    if deadline is None:
+        deadline = BATCH_DEADLINE
+    results = [None] * len(items)
+    pending = []
+    for i, (query, max_price, page) in enumerate(items):
+        cached = search_cache.peek(SearchCache.make_key(query, max_price, page))
+        if cached is not None:
+            results[i] = dict(cached, cache='hit')
+        else:
+            pending.append(i)
     
-    try:
-        amazon_products = scrape_amazon(query, max_price, page)
-        products.extend(amazon_products)
-        print(f"[PythonBackend] Found {len(amazon_products)} products from Amazon")
-    except Exception as e:
-        print(f"[PythonBackend] Amazon scraping error: {e}")
+    # One job per distinct (site, query, page); jobs queued site by site in turn so every
+    # retailer's rate limit is used from the start
+    queries = list(dict.fromkeys((normalize_query(items[i][0]), items[i][2]) for i in pending))
+    jobs = {}
+    job_status = {}
+    for query, page in queries:
+        for name, scraper in SCRAPERS:
+            health = site_health[name]
+            if not health.allow_request():
+                SITE_RESULTS.inc(site=name, status='skipped')
+                job_status[(name, query, page)] = {'status': 'skipped', 'error': 'circuit open'}
+                continue
+            timeout = min(health.timeout(), deadline)
+            jobs[(name, query, page)] = batch_executor.submit(run_scraper, scraper, query, None, page, timeout)
     
-    try:
-        myntra_products = scrape_myntra(query, max_price, page)
-        products.extend(myntra_products)
-        print(f"[PythonBackend] Found {len(myntra_products)} products from Myntra")
-    except Exception as e:
-        print(f"[PythonBackend] Myntra scraping error: {e}")
+    done, _ = wait(jobs.values(), timeout=deadline)
+    fetched = {}
+    for job, future in jobs.items():
+        name = job[0]
+        if future not in done:
+            future.cancel()
+            SITE_RESULTS.inc(site=name, status='timeout')
+            job_status[job] = {'status': 'timeout'}
+            continue
+        try:
+            fetched[job], site_ms = future.result()
+        except Exception as e:
+            SITE_RESULTS.inc(site=name, status='error')
+            job_status[job] = {'status': 'error', 'error': str(e)}
+            continue
+        SITE_RESULTS.inc(site=name, status='ok')
+        job_status[job] = {'status': 'ok', 'elapsed_ms': site_ms}
     
-    print(f"[PythonBackend] Total products found: {len(products)}")
-    return products
+    for i in pending:
+        query, max_price, page = items[i]
+        products = []
+        sites = {}
+        for name, _ in SCRAPERS:
+            job = (name, normalize_query(query), page)
+            site_products = [
+                product for product in fetched.get(job, [])
+                if within_budget(SPECS_BY_NAME[name], product, max_price)
+            ]
+            products.extend(site_products)
+            sites[name] = dict(job_status[job], count=len(site_products))
+        result = {'products': products, 'sites': sites}
+        search_cache.put(SearchCache.make_key(query, max_price, page), result, result_ttl(products, sites))
+        record_live_search(query, page, sites)
+        results[i] = dict(result, cache='miss')
+    
+    summary = {
+        'items': len(items),
+        'cache_hits': len(items) - len(pending),
+        'fetches': len(jobs),
+        'site_pages_without_dedup': len(pending) * len(SCRAPERS),
+    }
+    return results, summary
+
+def search_response(endpoint, source, started, payload):
+    """jsonify a search payload, recording serialize time and request latency"""
+    serialize_started = time.perf_counter()
+    response = jsonify(payload)
+    finished = time.perf_counter()
+    PHASE_SECONDS.observe(finished - serialize_started, site='all', phase='serialize')
+    SEARCH_SECONDS.observe(finished - started, endpoint=endpoint)
+    SEARCH_REQUESTS.inc(endpoint=endpoint, source=source)
+    return response
+
+def refresh_state_metrics():
+    """Copy cache, prefetch, circuit and catalog state into their metrics before a scrape of /metrics"""
+    cache = search_cache.stats()
+    for event in ('hits', 'stale_hits', 'misses', 'coalesced', 'refreshes', 'evictions', 'load_errors'):
+        CACHE_EVENTS.set(cache[event], event=event)
+    CACHE_ENTRIES.set(cache['entries'])
+    CACHE_BYTES.set(cache['bytes'])
+    CACHE_HIT_RATIO.set(cache['hit_rate'])
+    prefetch = prefetcher.stats()
+    for event in ('scheduled', 'skipped_budget', 'hits', 'waited_hits', 'expired', 'cancelled', 'errors'):
+        PREFETCH_EVENTS.set(prefetch[event], event=event)
+    PREFETCH_PENDING.set(prefetch['pending'])
+    PREFETCH_HIT_RATIO.set(prefetch['hit_rate'])
+    for name, _ in SCRAPERS:
+        health = site_health[name]
+        SITE_UP.set(1 if health.state == 'closed' else 0, site=name)
+        SITE_TIMEOUT.set(health.timeout(), site=name)
+    if catalog is not None:
+        for source, count in catalog.stats()['by_source'].items():
+            CATALOG_PRODUCTS.set(count, source=source)
 
 # Flask routes
 @app.route('/search', methods=['POST'])
 def search_products():
+    started = time.perf_counter()
     try:
         data = request.json
-        query = data.get('query', '')
-        budget = data.get('budget', 'budget-friendly')
-        page = int(data.get('page', 1))
-        if page < 1:
-            page = 1
+        query, budget, page = parse_search_request(data)
         
         print(f"[PythonBackend] Received search request - Query: '{query}', Budget: '{budget}', Page: {page}")
         
@@ -279,42 +479,194 @@ def search_products():
             print("[PythonBackend] Error: Query is required")
             return jsonify({'error': 'Query is required'}), 400
         
-        if budget == 'budget-friendly':
-            max_price = 1000
-        elif budget == 'mid-range':
-            max_price = 3000
-        else:
-            max_price = float('inf')
+        max_price = budget_to_max_price(budget)
+        mode = data.get('mode', 'live')
+        
+        if mode == 'catalog':
+            products = catalog_search(query, max_price, page)
+            if products is not None:
+                print(f"[PythonBackend] Found {len(products)} products in the catalog")
+                return search_response('/search', 'catalog', started, {
+                    'success': True,
+                    'products': products,
+                    'count': len(products),
+                    'sites': {},
+                    'source': 'catalog'
+                })
+            print("[PythonBackend] Catalog can't answer this query, falling back to a live scrape")
         
         print(f"[PythonBackend] Scraping products with max price: {max_price}")
-        products = scrape_products(query, max_price, page)
+        result, cache_status = cached_search(query, max_price, page)
+        products, sites = result['products'], result['sites']
+        if data.get('prefetch'):
+            prefetch_next_page(query, max_price, page, result)
         
-        print(f"[PythonBackend] Found {len(products)} products")
+        print(f"[PythonBackend] Found {len(products)} products (cache: {cache_status})")
         
         response_data = {
             'success': True,
             'products': products,
-            'count': len(products)
+            'count': len(products),
+            'sites': sites,
+            'cache': cache_status
         }
+        if mode == 'catalog':
+            response_data['source'] = 'live'
         
         print(f"[PythonBackend] Sending response with {len(products)} products")
-        return jsonify(response_data)
+        return search_response('/search', cache_status, started, response_data)
     
     except Exception as e:
         print(f"[PythonBackend] Error processing request: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/search/stream', methods=['POST'])
+def search_products_stream():
+    """
+    /search that streams: one event per retailer as soon as it finishes, then a summary.
+    NDJSON by default ({"type": "site", ...} / {"type": "summary", ...} per line);
+    Server-Sent Events when the body has "format": "sse" or the client accepts text/event-stream.
+    """
+    started = time.perf_counter()
+    try:
+        data = request.json
+        query, budget, page = parse_search_request(data)
+        
+        print(f"[PythonBackend] Received streaming search request - Query: '{query}', Budget: '{budget}', Page: {page}")
+        
+        if not query:
+            print("[PythonBackend] Error: Query is required")
+            return jsonify({'error': 'Query is required'}), 400
+        
+        max_price = budget_to_max_price(budget)
+    except Exception as e:
+        print(f"[PythonBackend] Error processing request: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    use_sse = data.get('format') == 'sse' or request.accept_mimetypes.best == 'text/event-stream'
+    formatter = format_sse if use_sse else format_ndjson
+    
+    def generate():
+        serialize_s = 0.0
+        source = 'error'
+        try:
+            for event, payload in stream_search_events(query, max_price, page, bool(data.get('prefetch'))):
+                serialize_started = time.perf_counter()
+                chunk = formatter(event, payload)
+                serialize_s += time.perf_counter() - serialize_started
+                if event == 'summary':
+                    source = payload['cache']
+                yield chunk
+        except Exception as e:
+            print(f"[PythonBackend] Error streaming search: {str(e)}")
+            yield formatter('error', {'error': str(e)})
+        PHASE_SECONDS.observe(serialize_s, site='all', phase='serialize')
+        SEARCH_SECONDS.observe(time.perf_counter() - started, endpoint='/search/stream')
+        SEARCH_REQUESTS.inc(endpoint='/search/stream', source=source)
+    
+    response = Response(generate(), mimetype='text/event-stream' if use_sse else 'application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (nginx) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/search/batch', methods=['POST'])
+def search_products_batch():
+    """
+    Many searches in one call: {"items": [{"query", "budget", "page"}, ...]}.
+    Each distinct (site, query, page) is fetched once and shared by every budget asking for it.
+    """
+    started = time.perf_counter()
+    try:
+        data = request.json or {}
+        raw_items = data.get('items') or []
+        if not isinstance(raw_items, list) or not raw_items:
+            return jsonify({'error': 'items must be a non-empty list'}), 400
+        if len(raw_items) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'At most {MAX_BATCH_ITEMS} items per batch'}), 400
+        
+        items = []
+        for i, raw in enumerate(raw_items):
+            if not isinstance(raw, dict):
+                return jsonify({'error': f'Item {i} must be an object'}), 400
+            try:
+                query, budget, page = parse_search_request(raw)
+            except (TypeError, ValueError):
+                return jsonify({'error': f'Item {i} has an invalid page'}), 400
+            if not query or not isinstance(query, str):
+                return jsonify({'error': 'Query is required for every item'}), 400
+            items.append((query, budget, page))
+        
+        print(f"[PythonBackend] Received batch search request with {len(items)} items")
+        results, summary = batch_search([(query, budget_to_max_price(budget), page) for query, budget, page in items])
+        print(f"[PythonBackend] Batch answered {summary['items']} items with {summary['fetches']} fetches ({summary['cache_hits']} cache hits)")
+        
+        return search_response('/search/batch', 'batch', started, {
+            'success': True,
+            'results': [
+                {
+                    'query': query,
+                    'budget': budget,
+                    'page': page,
+                    'products': result['products'],
+                    'count': len(result['products']),
+                    'sites': result['sites'],
+                    'cache': result['cache']
+                }
+                for (query, budget, page), result in zip(items, results)
+            ],
+            'summary': summary
+        })
+    
+    except Exception as e:
+        print(f"[PythonBackend] Error processing batch request: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(search_cache.stats())
+
+@app.route('/prefetch/stats', methods=['GET'])
+def prefetch_stats():
+    return jsonify(prefetcher.stats())
+
+@app.route('/catalog/stats', methods=['GET'])
+def catalog_stats():
+    if catalog is None:
+        return jsonify({'error': 'Catalog disabled'}), 503
+    return jsonify(catalog.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    refresh_state_metrics()
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'healthy'})
+    """Overall status plus each site's circuit state, adaptive timeout and recent latency"""
+    sites = {name: site_health[name].snapshot() for name, _ in SCRAPERS}
+    down = [name for name, site in sites.items() if site['state'] != 'closed']
+    if not down:
+        status = 'healthy'
+    elif len(down) < len(sites):
+        status = 'degraded'
+    else:
+        status = 'unhealthy'
+    return jsonify({'status': status, 'sites': sites})
 
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({
         'message': 'E-commerce Scraper API',
         'endpoints': {
-            '/search': 'POST - Search for products',
-            '/health': 'GET - Health check'
+            '/search': 'POST - Search for products ("mode": "catalog" to answer from the local catalog)',
+            '/search/stream': 'POST - Search for products, streamed per site (NDJSON or SSE)',
+            '/search/batch': 'POST - Many searches at once, sharing retailer fetches',
+            '/cache/stats': 'GET - Search cache hit/miss counters',
+            '/prefetch/stats': 'GET - Next-page prefetch hit rate',
+            '/catalog/stats': 'GET - Local product catalog size',
+            '/metrics': 'GET - Prometheus metrics',
+            '/health': 'GET - Health check with per-site status'
         }
     })
 
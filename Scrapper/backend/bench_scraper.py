@@ -0,0 +1,232 @@
+"""
+Offline scraper benchmarks on the saved retailer result pages in fixtures/.
+Reports, per site and parser: parse and extract time per page and products extracted per second;
+then end-to-end /search latency percentiles under concurrent load with the replay server standing
+in for the retailers, and traced memory per /search request. Results are written as JSON so runs
+can be diffed between parser and concurrency changes. Nothing touches the network.
+
+Run: cd Scrapper/backend && python bench_scraper.py --concurrency 1 4 16 --requests 100 --latency 200 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Keep benchmark scrapes out of the real product catalog
+os.environ.setdefault('CATALOG_PATH', os.path.join(tempfile.mkdtemp(prefix='bench-catalog-'), 'catalog.db'))
+
+import bs4
+import requests
+from werkzeug.serving import make_server
+
+import app as scraper_app
+import extraction
+import http_client
+from replay_server import ReplayConfig, fixture_path, replay_specs, start_replay_server
+from site_health import percentile
+
+PARSERS = ['lxml', 'html.parser']
+
+
+def _percentiles(samples_ms):
+    """p50/p90/p99/max/mean, percentiles by nearest rank as /health reports them"""
+    if not samples_ms:
+        return {}
+    return {
+        'p50': percentile(samples_ms, 50),
+        'p90': percentile(samples_ms, 90),
+        'p99': percentile(samples_ms, 99),
+        'max': max(samples_ms),
+        'mean': sum(samples_ms) / len(samples_ms),
+    }
+
+
+def bench_parse(parser, iterations=20):
+    """Parse + extract every fixture page `iterations` times with one parser"""
+    extraction.PARSER = parser
+    results = []
+    for spec in extraction.SITE_SPECS:
+        path = fixture_path(spec['name'])
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            html = f.read()
+        parse_ms = []
+        extract_ms = []
+        n_products = 0
+        for _ in range(iterations):
+            started = time.perf_counter()
+            items = extraction.find_containers(spec, html)
+            parsed = time.perf_counter()
+            preferred = {}
+            products = [p for p in (extraction.extract_item(spec, item, preferred) for item in items) if p is not None]
+            parse_ms.append((parsed - started) * 1000.0)
+            extract_ms.append((time.perf_counter() - parsed) * 1000.0)
+            n_products = len(products)
+        total_s = (sum(parse_ms) + sum(extract_ms)) / 1000.0
+        results.append({
+            'site': spec['name'],
+            'parser': parser,
+            'page_bytes': len(html),
+            'containers': len(items),
+            'products': n_products,
+            'parse_ms': _percentiles(parse_ms),
+            'extract_ms': _percentiles(extract_ms),
+            'products_per_s': n_products * iterations / total_s if total_s else 0.0,
+        })
+    return results
+
+
+def _use_replay(base_url):
+    """Point the app's scrapers at the replay server and lift its rate limit"""
+    host = base_url.split('://', 1)[1]
+    http_client.HOST_RATE_LIMITS[host] = (1e6, 1e6)
+    scraper_app.SCRAPERS = [(spec['name'], partial(scraper_app.scrape_site, spec)) for spec in replay_specs(base_url)]
+
+
+def bench_search_load(base_url, concurrency, n_requests, cached=False):
+    """Fire n_requests /search calls from `concurrency` clients; unique queries unless cached"""
+    samples = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(i):
+        query = 'bench t shirt' if cached else f'bench t shirt {concurrency}-{i}'
+        started = time.perf_counter()
+        try:
+            response = requests.post(f'{base_url}/search', json={'query': query, 'budget': 'mid-range'}, timeout=60)
+            ok = response.status_code == 200 and response.json().get('success')
+        except requests.RequestException:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000.0
+        with lock:
+            samples.append(elapsed)
+            if not ok:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n_requests)))
+    wall_s = time.perf_counter() - started
+    return {
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'errors': errors[0],
+        'latency_ms': _percentiles(samples),
+        'throughput_rps': n_requests / wall_s if wall_s else 0.0,
+    }
+
+
+def bench_memory(samples=5):
+    """Peak traced memory of single in-process /search requests (unique queries, so no cache hits)"""
+    client = scraper_app.app.test_client()
+    peaks = []
+    for i in range(samples):
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            client.post('/search', json={'query': f'bench memory {i}', 'budget': 'mid-range'})
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peaks.append(peak)
+    return {'samples': samples, 'peak_bytes_mean': sum(peaks) / len(peaks), 'peak_bytes_max': max(peaks)}
+
+
+def run_benchmarks(parsers, concurrency_levels, n_requests, iterations=20, latency_ms=0, jitter_ms=0,
+                   failure_rate=0.0, drop_rate=0.0, seed=0, log=print):
+    """Run every benchmark; returns the JSON-ready report"""
+    results = {'parse': [], 'search': [], 'memory': None}
+    for parser in parsers:
+        for result in bench_parse(parser, iterations):
+            results['parse'].append(result)
+            if log:
+                log(
+                    f"[Bench] parse {result['site']:<9} {parser:<12} {result['page_bytes'] / 1024:7.1f}KiB "
+                    f"parse p50={result['parse_ms'].get('p50', 0):7.2f}ms extract p50={result['extract_ms'].get('p50', 0):6.2f}ms "
+                    f"{result['products_per_s']:8.0f} products/s"
+                )
+    extraction.PARSER = parsers[0]
+
+    config = ReplayConfig(latency_ms, jitter_ms, failure_rate, drop_rate, seed=seed)
+    replay, replay_url = start_replay_server(config)
+    _use_replay(replay_url)
+    scraper_app.search_cache.clear()
+    server = make_server('127.0.0.1', 0, scraper_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    app_url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        for concurrency in concurrency_levels:
+            result = bench_search_load(app_url, concurrency, n_requests)
+            results['search'].append(result)
+            if log:
+                log(
+                    f"[Bench] /search c={concurrency:<4} p50={result['latency_ms'].get('p50', 0):8.1f}ms "
+                    f"p90={result['latency_ms'].get('p90', 0):8.1f}ms p99={result['latency_ms'].get('p99', 0):8.1f}ms "
+                    f"{result['throughput_rps']:7.1f} req/s errors={result['errors']}"
+                )
+        config.latency_ms = config.jitter_ms = 0
+        results['memory'] = bench_memory()
+        if log:
+            log(f"[Bench] memory per /search: peak {results['memory']['peak_bytes_mean'] / 2**20:.1f}MiB mean")
+    finally:
+        server.shutdown()
+        replay.shutdown()
+
+    return {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'bs4': bs4.__version__,
+            'machine': platform.machine(),
+            'parsers': parsers,
+            'iterations': iterations,
+            'requests': n_requests,
+            'latency_ms': latency_ms,
+            'jitter_ms': jitter_ms,
+            'failure_rate': failure_rate,
+            'drop_rate': drop_rate,
+            'replay_responses': dict(replay.counters),
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline scraper benchmarks on saved retailer pages')
+    parser.add_argument('--parsers', nargs='+', default=PARSERS, choices=PARSERS)
+    parser.add_argument('--iterations', type=int, default=20, help='parses per fixture page')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=100, help='/search calls per concurrency level')
+    parser.add_argument('--latency', type=float, default=200, help='replayed retailer latency (ms)')
+    parser.add_argument('--jitter', type=float, default=50, help='replayed latency jitter (ms)')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_scraper.json', help='JSON results path')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        args.parsers,
+        args.concurrency,
+        args.requests,
+        iterations=args.iterations,
+        latency_ms=args.latency,
+        jitter_ms=args.jitter,
+        failure_rate=args.failure_rate,
+        drop_rate=args.drop_rate,
+        seed=args.seed,
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"[Bench] Wrote results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Persistent local product catalog: every scraped product, what each live search listed, and an FTS5 index"""
+import sqlite3
+import threading
+import time
+
+from search_cache import normalize_query
+
+# Bumped whenever the layout changes; the catalog only holds re-scrapable data, so an older
+# layout is dropped and rebuilt rather than migrated
+SCHEMA_VERSION = 2
+
+DROP_SCHEMA = '''
+DROP TABLE IF EXISTS searches;
+DROP TABLE IF EXISTS search_pages;
+DROP TABLE IF EXISTS search_results;
+DROP TABLE IF EXISTS products_fts;
+DROP TABLE IF EXISTS products;
+'''
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    link TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    price INTEGER,
+    source TEXT NOT NULL,
+    image TEXT NOT NULL DEFAULT '',
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_price ON products(price);
+CREATE INDEX IF NOT EXISTS products_last_seen ON products(last_seen);
+
+-- External-content FTS index over titles and product names (Myntra's title is only the brand),
+-- kept in sync by the triggers below
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    title, name, content='products', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts(rowid, title, name) VALUES (new.id, new.title, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, title, name) VALUES ('delete', old.id, old.title, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS products_au AFTER UPDATE OF title, name ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, title, name) VALUES ('delete', old.id, old.title, old.name);
+    INSERT INTO products_fts(rowid, title, name) VALUES (new.id, new.title, new.name);
+END;
+
+-- What each retailer listed, in order, on a results page of a normalized query when last scraped live
+CREATE TABLE IF NOT EXISTS search_results (
+    query TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    PRIMARY KEY (query, page, source, position)
+);
+
+-- When each (normalized query, page) was last scraped live with every site answering; decides
+-- whether the catalog may answer it
+CREATE TABLE IF NOT EXISTS search_pages (
+    query TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    scraped_at REAL NOT NULL,
+    PRIMARY KEY (query, page)
+);
+'''
+
+UPSERT = '''
+INSERT INTO products (link, title, name, price, source, image, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(link) DO UPDATE SET
+    title = excluded.title,
+    name = excluded.name,
+    price = excluded.price,
+    source = excluded.source,
+    image = excluded.image,
+    last_seen = excluded.last_seen
+'''
+
+
+def fts_query(query):
+    """FTS5 MATCH expression requiring every word of a search query (quoted, so no syntax leaks in)"""
+    words = normalize_query(query).replace('"', ' ').split()
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def format_price(price):
+    return f'₹{price}' if price else 'Price on site'
+
+
+def _product(title, name, price, link, image, source):
+    """A catalog row in the same dict layout as the scrapers"""
+    product = {
+        'title': title,
+        'price': format_price(price),
+        'price_value': price,
+        'link': link,
+        'image': image,
+        'source': source
+    }
+    if name:
+        product['name'] = name
+    return product
+
+
+class Catalog:
+    """
+    Thread-safe wrapper around one SQLite connection (writes are serialized by a lock; WAL keeps
+    reads cheap). Products are deduplicated by link; price is kept as an integer.
+    """
+
+    def __init__(self, path='catalog.db'):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            version, = self._conn.execute('PRAGMA user_version').fetchone()
+            if version != SCHEMA_VERSION:
+                self._conn.executescript(DROP_SCHEMA)
+            self._conn.executescript(SCHEMA)
+            self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    @staticmethod
+    def _rows(products, seen_at):
+        return [
+            (p['link'], p['title'], p.get('name') or '', p.get('price_value'), p['source'], p.get('image') or '', seen_at, seen_at)
+            for p in products
+            if p.get('link') and p.get('title')
+        ]
+
+    def upsert(self, products, seen_at=None):
+        """Insert or refresh scraped products (dicts with title, price_value, link, image, source, optional name)"""
+        rows = self._rows(products, time.time() if seen_at is None else seen_at)
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(UPSERT, rows)
+        return len(rows)
+
+    def record_page(self, query, page, source, products, seen_at=None):
+        """
+        Catalog everything one retailer listed on a results page (before any budget filter) and
+        remember that listing, in order, as its answer for this query and page
+        """
+        rows = self._rows(products, time.time() if seen_at is None else seen_at)
+        query = normalize_query(query)
+        with self._lock, self._conn:
+            self._conn.executemany(UPSERT, rows)
+            self._conn.execute(
+                'DELETE FROM search_results WHERE query = ? AND page = ? AND source = ?', (query, page, source)
+            )
+            self._conn.executemany(
+                'INSERT INTO search_results (query, page, source, position, link) VALUES (?, ?, ?, ?, ?)',
+                [(query, page, source, position, row[0]) for position, row in enumerate(rows)]
+            )
+        return len(rows)
+
+    def record_search(self, query, page=1, scraped_at=None):
+        """Mark a results page of a query as just scraped live by every site"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO search_pages (query, page, scraped_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(query, page) DO UPDATE SET scraped_at = excluded.scraped_at',
+                (normalize_query(query), page, time.time() if scraped_at is None else scraped_at)
+            )
+
+    def is_fresh(self, query, page, max_age):
+        """Whether the query's results page was scraped live within the last max_age seconds"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT scraped_at FROM search_pages WHERE query = ? AND page = ?', (normalize_query(query), page)
+            ).fetchone()
+        return row is not None and time.time() - row[0] <= max_age
+
+    def results(self, query, page=1):
+        """
+        Products the last live scrape listed on a results page of a query, unfiltered and in listing
+        order per site (sites in name order), in the same dict layout as the scrapers
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT p.title, p.name, p.price, p.link, p.image, p.source FROM search_results r '
+                'JOIN products p ON p.link = r.link '
+                'WHERE r.query = ? AND r.page = ? ORDER BY r.source, r.position',
+                (normalize_query(query), page)
+            ).fetchall()
+        return [_product(*row) for row in rows]
+
+    def search(self, query, max_price=None, min_price=None, max_age=None, limit=60, offset=0, unfiltered_sources=()):
+        """
+        Products whose title or name matches every query word, best match first, in the same dict
+        layout as the scrapers. Prices outside [min_price, max_price] are excluded (unpriced products
+        and those from `unfiltered_sources` are kept), as are products not seen within max_age seconds.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = [
+            'SELECT p.title, p.name, p.price, p.link, p.image, p.source FROM products_fts',
+            'JOIN products p ON p.id = products_fts.rowid',
+            'WHERE products_fts MATCH ?',
+        ]
+        params = [match]
+        unfiltered = ''.join(' OR p.source = ?' for _ in unfiltered_sources)
+        if max_price is not None and max_price != float('inf'):
+            sql.append(f'AND (p.price IS NULL{unfiltered} OR p.price <= ?)')
+            params.extend([*unfiltered_sources, max_price])
+        if min_price:
+            sql.append(f'AND (p.price IS NULL{unfiltered} OR p.price >= ?)')
+            params.extend([*unfiltered_sources, min_price])
+        if max_age is not None:
+            sql.append('AND p.last_seen >= ?')
+            params.append(time.time() - max_age)
+        sql.append('ORDER BY bm25(products_fts) LIMIT ? OFFSET ?')
+        params.extend([limit, offset])
+        with self._lock:
+            rows = self._conn.execute(' '.join(sql), params).fetchall()
+        return [_product(*row) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            products, = self._conn.execute('SELECT COUNT(*) FROM products').fetchone()
+            searches, = self._conn.execute('SELECT COUNT(*) FROM search_pages').fetchone()
+            by_source = dict(self._conn.execute('SELECT source, COUNT(*) FROM products GROUP BY source').fetchall())
+        return {'products': products, 'searches': searches, 'by_source': by_source}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,286 @@
+"""Declarative product extraction: one spec per retailer, one engine for all of them"""
+import importlib.util
+import re
+import time
+from urllib.parse import urljoin
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+PARSER = 'lxml' if importlib.util.find_spec('lxml') is not None else 'html.parser'
+
+# Containers considered per results page
+MAX_ITEMS = 20
+
+
+def extract_price(price_text):
+    """Extract numeric price from text"""
+    try:
+        price_text = re.sub(r'[₹,]', '', price_text)
+        match = re.search(r'\d+', price_text)
+        if match:
+            return int(match.group())
+    except:
+        pass
+    return None
+
+
+def class_strainer(tag, *classes):
+    """SoupStrainer keeping only `tag` elements carrying any of `classes` (matched on the raw class string)"""
+    pattern = re.compile(r'(?:^|\s)(?:%s)(?:\s|$)' % '|'.join(map(re.escape, classes)))
+    return SoupStrainer(tag, attrs={'class': pattern})
+
+
+# Site specs. Every selector list is a fallback cascade (retailers change their markup often);
+# within one page the engine tries the field selector that matched the previous item first.
+#   url          search URL template; {query} is joined with `query_space`
+#   base_url     prefix for relative links
+#   strainer     only these elements are built into the tree; pages where they yield no container
+#                are re-parsed in full
+#   containers   one product per match, first MAX_ITEMS
+#   fields       title / price / image / link cascades; link may be 'title' to take the title's
+#                own href or its first <a>; an optional name cascade is for sites whose title is only
+#                the brand (Myntra), so the catalog can search the product name too
+#   price_filter 'required': drop items without a price or above max_price
+#                'optional': drop items above max_price, keep unpriced ones
+#                None: no budget filtering
+SITE_SPECS = [
+    {
+        'name': 'Flipkart',
+        'url': 'https://www.flipkart.com/search?q={query}&page={page}',
+        'query_space': '%20',
+        'base_url': 'https://www.flipkart.com',
+        # _1YokD2 is also Flipkart's page-wide wrapper class, so only the last-resort full parse looks for it
+        'strainer': class_strainer('div', '_1AtVbE', '_2kHMtA'),
+        'containers': ['div._1AtVbE', 'div._2kHMtA', 'div._1YokD2'],
+        'fields': {
+            'title': ['a.s1Q9rs', 'a.IRpwTa', 'a._2UzuFa', 'div._4rR01T'],
+            'price': ['div._30jeq3', 'div._25b18c', 'div._1_WHN1'],
+            'image': ['img._396cs4', 'img._2r_T1I', 'img'],
+            'link': 'title',
+        },
+        'price_filter': 'required',
+    },
+    {
+        'name': 'Amazon',
+        'url': 'https://www.amazon.in/s?k={query}&page={page}',
+        'query_space': '+',
+        'base_url': 'https://www.amazon.in',
+        'strainer': SoupStrainer('div', attrs={'data-component-type': 's-search-result'}),
+        'containers': ['div[data-component-type="s-search-result"]', 'div.s-result-item'],
+        'fields': {
+            'title': ['h2.a-size-mini', 'h2.a-size-base-plus', 'h2'],
+            'price': ['span.a-price-whole', 'span.a-price', 'span.a-offscreen'],
+            'image': ['img.s-image', 'img[data-image-latency]', 'img'],
+            'link': ['a.a-link-normal', 'h2 a'],
+        },
+        'price_filter': None,
+    },
+    {
+        'name': 'Myntra',
+        'url': 'https://www.myntra.com/{query}',
+        'query_space': '%20',
+        'base_url': 'https://www.myntra.com',
+        'strainer': class_strainer('li', 'product-base'),
+        'containers': ['li.product-base', 'div.product-productMetaInfo'],
+        'fields': {
+            'title': ['h3.product-brand', 'h4.product-product', 'a.product-productMetaInfo'],
+            'name': ['h4.product-product'],
+            'price': ['span.product-discountedPrice', 'span.product-price'],
+            'image': ['img.img-responsive', 'img'],
+            'link': ['a[href]'],
+        },
+        'price_filter': 'optional',
+    },
+]
+
+SPECS_BY_NAME = {spec['name']: spec for spec in SITE_SPECS}
+
+
+# A simple compound selector: optional tag, then classes / ids / attribute tests
+_COMPOUND = re.compile(r'([a-zA-Z][\w-]*|\*)?((?:[.#][\w-]+|\[[^\]]+\])*)')
+_COMPOUND_PART = re.compile(r'[.#][\w-]+|\[[^\]]+\]')
+
+
+def _subsumes(general, specific):
+    """Whether CSS `general` matches every element `specific` does (only decided for simple compounds)"""
+    parsed = []
+    for css in (general, specific):
+        match = _COMPOUND.fullmatch(css.strip())
+        if match is None:
+            return False
+        parsed.append((match.group(1) or '*', set(_COMPOUND_PART.findall(match.group(2)))))
+    (tag, parts), (specific_tag, specific_parts) = parsed
+    return tag in ('*', specific_tag) and parts <= specific_parts
+
+
+class _Cascade:
+    """Compiled fallback selectors, tried in order unless a caller-held preference is safe to use"""
+
+    def __init__(self, selectors):
+        self.selectors = [soupsieve.compile(css) for css in selectors]
+        # A catch-all such as a bare "img" after "img.s-image" can pick a different element than the
+        # selector it falls back from, so it is never tried ahead of it
+        self.promotable = [
+            i > 0 and not any(_subsumes(css, earlier) for earlier in selectors[:i])
+            for i, css in enumerate(selectors)
+        ]
+
+    def select_one(self, node, preferred=0):
+        """(first match or None, index of the selector that found it), trying `preferred` first"""
+        missed = None
+        if preferred:
+            found = self.selectors[preferred].select_one(node)
+            if found is None:
+                missed = preferred
+            # A wrapper such as span.a-price holding an earlier selector's span.a-price-whole is not
+            # taken out of order: the earlier selector wins wherever it matches that element or inside it
+            elif not any(
+                earlier.match(found) or earlier.select_one(found) is not None
+                for earlier in self.selectors[:preferred]
+            ):
+                return found, preferred
+        for i, selector in enumerate(self.selectors):
+            if i != missed:
+                found = selector.select_one(node)
+                if found is not None:
+                    return found, i
+        return None, None
+
+    def select(self, node, limit):
+        for selector in self.selectors:
+            found = selector.select(node, limit=limit)
+            if found:
+                return found
+        return []
+
+
+_compiled = {}
+
+
+def _compile(spec):
+    """Compiled cascades for a spec, built once per site"""
+    compiled = _compiled.get(spec['name'])
+    if compiled is None:
+        compiled = {'containers': _Cascade(spec['containers'])}
+        for field, selectors in spec['fields'].items():
+            if selectors != 'title':
+                compiled[field] = _Cascade(selectors)
+        _compiled[spec['name']] = compiled
+    return compiled
+
+
+def _select_field(compiled, field, item, preferred):
+    """The field's element in an item, updating the page's `preferred` selector index per field"""
+    cascade = compiled[field]
+    found, index = cascade.select_one(item, preferred.get(field, 0))
+    if index == 0 or (index is not None and cascade.promotable[index]):
+        preferred[field] = index
+    return found
+
+
+def search_url(spec, query, page=1):
+    return spec['url'].format(query=query.replace(' ', spec['query_space']), page=page)
+
+
+def find_containers(spec, html):
+    """Product containers on a results page, parsing only the spec's strainer elements when possible"""
+    cascade = _compile(spec)['containers']
+    if spec.get('strainer') is not None:
+        soup = BeautifulSoup(html, PARSER, parse_only=spec['strainer'])
+        items = cascade.select(soup, MAX_ITEMS)
+        if items:
+            return items
+    soup = BeautifulSoup(html, PARSER)
+    return cascade.select(soup, MAX_ITEMS)
+
+
+def _absolute(spec, href):
+    if href and not href.startswith('http'):
+        # urljoin so path-relative links ("tshirts/...", as Myntra uses) get their slash
+        return urljoin(spec['base_url'] + '/', href)
+    return href
+
+
+def within_budget(spec, product, max_price):
+    """Apply the spec's price_filter to an extracted product"""
+    price = product['price_value']
+    price_filter = spec['price_filter']
+    if price_filter == 'required':
+        return bool(price) and price <= max_price
+    if price_filter == 'optional':
+        return not price or price <= max_price
+    return True
+
+
+def extract_item(spec, item, preferred=None):
+    """
+    One product dict from a container, or None if it lacks a title or link.
+    `preferred` carries which selector matched per field from one item to the next on a page.
+    """
+    compiled = _compile(spec)
+    preferred = {} if preferred is None else preferred
+    title_elem = _select_field(compiled, 'title', item, preferred)
+    if title_elem is None:
+        return None
+    title = title_elem.text.strip()
+    if not title:
+        return None
+
+    if spec['fields']['link'] == 'title':
+        link_elem = title_elem if title_elem.name == 'a' else title_elem.find('a')
+    else:
+        link_elem = _select_field(compiled, 'link', item, preferred)
+    link = _absolute(spec, link_elem.get('href', '') if link_elem is not None else '')
+    if not link:
+        return None
+
+    price_elem = _select_field(compiled, 'price', item, preferred)
+    price = extract_price(price_elem.text.strip()) if price_elem is not None else None
+
+    image_elem = _select_field(compiled, 'image', item, preferred)
+    image = (image_elem.get('src') or image_elem.get('data-src', '')) if image_elem is not None else ''
+
+    product = {
+        'title': title,
+        'price': f'₹{price}' if price else 'Price on site',
+        'price_value': price,
+        'link': link,
+        'image': image,
+        'source': spec['name']
+    }
+    if 'name' in compiled:
+        name_elem = _select_field(compiled, 'name', item, preferred)
+        name = name_elem.text.strip() if name_elem is not None else ''
+        if name and name != title:
+            product['name'] = name
+    return product
+
+
+def extract_products(spec, html, max_price=None, stats=None):
+    """
+    Products a spec extracts from a results page; budget-filtered unless max_price is None.
+    A `stats` dict, if given, receives parse_s / extract_s timings and containers found vs products extracted.
+    """
+    started = time.perf_counter()
+    items = find_containers(spec, html)
+    parsed = time.perf_counter()
+    products = []
+    extracted = 0
+    preferred = {}
+    for item in items:
+        try:
+            product = extract_item(spec, item, preferred)
+        except Exception:
+            continue
+        if product is None:
+            continue
+        extracted += 1
+        if max_price is None or within_budget(spec, product, max_price):
+            products.append(product)
+    if stats is not None:
+        stats['parse_s'] = parsed - started
+        stats['extract_s'] = time.perf_counter() - parsed
+        stats['found'] = len(items)
+        stats['extracted'] = extracted
+    return products
@@ -0,0 +1,167 @@
+"""Shared HTTP client for the scrapers: pooled keep-alive sessions, retries and per-host rate limits"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-IN,en;q=0.9',
+    # urllib3 advertises only what it can decode: "gzip,deflate", plus ",br" when brotli is installed
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+}
+
+# Connections kept open per host (one per concurrent search hitting that retailer)
+POOL_SIZE = 10
+
+# Retries for connection errors and throttling/5xx responses, with exponential backoff
+# (0.3s, 0.6s); all of it has to fit in the timeout given to get()
+MAX_RETRIES = 2
+BACKOFF_FACTOR = 0.3
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# Longest Retry-After waited out; a retailer asking for more is answered with its own response now
+MAX_RETRY_AFTER = 2.0
+# Only used for its Retry-After parsing (seconds or HTTP date)
+_RETRY_AFTER = Retry(0)
+
+# Token-bucket limits per host: (requests per second, burst)
+HOST_RATE_LIMITS = {
+    'www.flipkart.com': (2.0, 4),
+    'www.amazon.in': (1.0, 3),
+    'www.myntra.com': (2.0, 4),
+}
+DEFAULT_RATE_LIMIT = (2.0, 4)
+
+
+class RateLimitExceeded(requests.RequestException):
+    """No token became available for a host within the request timeout"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting up to `timeout` seconds; return False if none became available"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_s = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait_s > deadline:
+                return False
+            time.sleep(wait_s)
+
+
+_sessions = {}
+_buckets = {}
+_registry_lock = threading.Lock()
+
+
+def _host_state(host):
+    """Session (own connection pool) and rate limiter for a host, created on first use"""
+    with _registry_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=False)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[host] = session
+            rate, burst = HOST_RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+            _buckets[host] = TokenBucket(rate, burst)
+        return session, _buckets[host]
+
+
+def _retry_delay(attempt, response=None):
+    """Backoff before retry number `attempt` (1-based), or the response's Retry-After if longer"""
+    delay = BACKOFF_FACTOR * (2 ** (attempt - 1))
+    if response is not None:
+        retry_after = _RETRY_AFTER.get_retry_after(response.raw)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+    return delay
+
+
+def get(url, timeout=15, headers=None, **kwargs):
+    """
+    GET through the host's pooled session, after taking a rate-limit token.
+    `timeout` bounds the whole call: the token wait, every attempt and the backoff between them.
+    A retry that would not fit returns the last response (or raises the last error) instead.
+    The response's `fetch_s` is the seconds spent on the request itself (attempts and backoff,
+    without the token wait).
+    """
+    deadline = time.monotonic() + timeout
+    host = urlsplit(url).netloc
+    session, bucket = _host_state(host)
+    if not bucket.acquire(timeout=timeout):
+        raise RateLimitExceeded(f'Rate limit for {host} not available within {timeout}s')
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout(f'No time left for {host} within {timeout}s')
+        try:
+            response = session.get(url, timeout=remaining, headers=headers, **kwargs)
+        except requests.ConnectionError:
+            # Connection refused/reset or connect timeout; read timeouts have used up the budget
+            attempt += 1
+            delay = _retry_delay(attempt)
+            if attempt > MAX_RETRIES or time.monotonic() + delay >= deadline:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                response.fetch_s = time.monotonic() - started
+                return response
+            attempt += 1
+            delay = _retry_delay(attempt, response)
+            if attempt > MAX_RETRIES or delay > MAX_RETRY_AFTER or time.monotonic() + delay >= deadline:
+                response.fetch_s = time.monotonic() - started
+                return response
+            response.close()
+        time.sleep(delay)
+
+
+def wire_bytes(response):
+    """Body bytes as received (before gzip/br decoding): what the connection read, else Content-Length, else the body size"""
+    body = response.content  # reads the whole body, so the connection's count is complete
+    try:
+        read = response.raw.tell()
+    except (AttributeError, OSError):
+        read = 0
+    if read:
+        return read
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return len(body)
+
+
+def close():
+    """Close all pooled connections"""
+    with _registry_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _buckets.clear()
@@ -0,0 +1,83 @@
+"""Background prefetch of the next /search results page, bounded by a worker pool and a global budget"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+
+class Prefetcher:
+    """
+    Loads search results ahead of the request that will want them.
+    - schedule() queues a load unless the key is already prefetched, or `budget` prefetches are
+      already queued, running or waiting to be consumed.
+    - take() hands a finished prefetch to the request (waiting for one that is already running);
+      a prefetch that hasn't started yet is cancelled so the request loads it itself.
+    - Results nobody takes within `expire_after` seconds are dropped.
+    """
+
+    def __init__(self, max_workers=2, budget=20, expire_after=300):
+        self.budget = budget
+        self.expire_after = expire_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        # key -> (future, expires_at)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats = {'scheduled': 0, 'skipped_budget': 0, 'hits': 0, 'waited_hits': 0, 'expired': 0, 'cancelled': 0, 'errors': 0}
+
+    def _expire(self, now):
+        for key, (future, expires_at) in list(self._entries.items()):
+            if now >= expires_at:
+                del self._entries[key]
+                if future.cancel():
+                    self._stats['cancelled'] += 1
+                else:
+                    self._stats['expired'] += 1
+
+    def schedule(self, key, loader):
+        """Queue loader() for key; return False if it was already scheduled or over budget"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if key in self._entries:
+                return False
+            if len(self._entries) >= self.budget:
+                self._stats['skipped_budget'] += 1
+                return False
+            self._entries[key] = (self._executor.submit(loader), now + self.expire_after)
+            self._stats['scheduled'] += 1
+            return True
+
+    def take(self, key, timeout=None):
+        """Return the prefetched value for key and forget it, or None if there is none to use"""
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            future = entry[0]
+            if future.cancel():
+                self._stats['cancelled'] += 1
+                return None
+            waited = not future.done()
+        try:
+            value = future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            return None
+        except Exception as e:
+            print(f"[Prefetch] Prefetch failed: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return None
+        with self._lock:
+            self._stats['hits'] += 1
+            if waited:
+                self._stats['waited_hits'] += 1
+        return value
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            stats = dict(self._stats)
+            stats['pending'] = len(self._entries)
+        resolved = stats['hits'] + stats['expired'] + stats['cancelled'] + stats['errors']
+        stats['hit_rate'] = stats['hits'] / resolved if resolved else 0.0
+        return stats
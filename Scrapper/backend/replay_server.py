@@ -0,0 +1,152 @@
+"""
+Local stand-in for the retailers: serves saved result pages from fixtures/ with configurable
+latency and failure injection, so scraper changes can be measured without hitting live sites.
+
+  /flipkart/...  -> fixtures/flipkart_search.html
+  /amazon/...    -> fixtures/amazon_search.html
+  /myntra/...    -> fixtures/myntra_search.html
+
+Run: cd Scrapper/backend && python replay_server.py --port 5050 --latency 300 --jitter 100 --failure-rate 0.05
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from extraction import SITE_SPECS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture_path(site, fixtures_dir=FIXTURES_DIR):
+    return os.path.join(fixtures_dir, f'{site.lower()}_search.html')
+
+
+class ReplayConfig:
+    """
+    Behaviour of the replay server, adjustable while it runs.
+    - latency_ms / jitter_ms: response delay, uniform in latency ± jitter (per-site overrides in site_latency_ms)
+    - failure_rate: share of requests answered with 503 (the HTTP client retries these)
+    - drop_rate: share of requests whose connection is closed without a response
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, failure_rate=0.0, drop_rate=0.0, site_latency_ms=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.site_latency_ms = dict(site_latency_ms or {})
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay_s(self, site):
+        latency = self.site_latency_ms.get(site, self.latency_ms)
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, latency + jitter) / 1000.0
+
+    def outcome(self):
+        """'ok', 'fail' or 'drop' for the next request"""
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.drop_rate:
+            return 'drop'
+        if roll < self.drop_rate + self.failure_rate:
+            return 'fail'
+        return 'ok'
+
+
+def make_handler(pages, config, counters):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            site = self.path.lstrip('/').split('/', 1)[0].lower()
+            body = pages.get(site)
+            if body is None:
+                self.send_error(404, f'No fixture for {site!r}')
+                return
+            time.sleep(config.delay_s(site))
+            outcome = config.outcome()
+            with config.lock:
+                counters[outcome] = counters.get(outcome, 0) + 1
+            if outcome == 'drop':
+                self.close_connection = True
+                self.connection.close()
+                return
+            if outcome == 'fail':
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+def load_pages(fixtures_dir=FIXTURES_DIR):
+    """Fixture bytes per site key ('flipkart', ...), for every spec that has a saved page"""
+    pages = {}
+    for spec in SITE_SPECS:
+        path = fixture_path(spec['name'], fixtures_dir)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                pages[spec['name'].lower()] = f.read()
+    return pages
+
+
+def start_replay_server(config=None, host='127.0.0.1', port=0, fixtures_dir=FIXTURES_DIR):
+    """Serve fixtures on a background thread; return (server, base_url). Stop with server.shutdown()."""
+    config = config or ReplayConfig()
+    counters = {}
+    server = ThreadingHTTPServer((host, port), make_handler(load_pages(fixtures_dir), config, counters))
+    server.daemon_threads = True
+    server.config = config
+    # Responses served per outcome ('ok' / 'fail' / 'drop')
+    server.counters = counters
+    thread = threading.Thread(target=server.serve_forever, name='replay-server', daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def replay_specs(base_url, specs=SITE_SPECS):
+    """Copies of the site specs that fetch from the replay server instead of the retailer (links stay absolute to the retailer)"""
+    replayed = []
+    for spec in specs:
+        site = spec['name'].lower()
+        replayed.append(dict(spec, url=f'{base_url}/{site}/search?q={{query}}&page={{page}}'))
+    return replayed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay saved retailer result pages')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--latency', type=float, default=0, help='mean response delay (ms)')
+    parser.add_argument('--jitter', type=float, default=0, help='uniform +/- delay jitter (ms)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of 503 responses')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='share of dropped connections')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = ReplayConfig(args.latency, args.jitter, args.failure_rate, args.drop_rate, seed=args.seed)
+    server, base_url = start_replay_server(config, args.host, args.port)
+    print(f"[Replay] Serving {', '.join(load_pages())} fixtures on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""In-memory /search result cache: TTL + LRU under a memory bound, stale-while-revalidate, single-flight"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def normalize_query(query):
+    """Cache-key form of a search query: lowercase, single-spaced"""
+    return ' '.join(str(query).lower().split())
+
+
+def estimate_size(value):
+    """Approximate memory cost of a cached value (its JSON length in bytes)"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'fresh_until', 'stale_until')
+
+    def __init__(self, value, size, fresh_until, stale_until):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class SearchCache:
+    """
+    Thread-safe cache keyed on (normalized query, price tier, page).
+    - Fresh entries are served directly; entries past their TTL but within `stale_ttl` are served
+      immediately while one background refresh runs (stale-while-revalidate).
+    - Concurrent misses for the same key share one in-flight load instead of each scraping.
+    - Least recently used entries are evicted beyond `max_entries` or `max_bytes`.
+    """
+
+    def __init__(self, ttl=600, stale_ttl=1800, max_entries=1000, max_bytes=64 * 1024 * 1024, refresh_workers=2):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='cache-refresh')
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'evictions': 0, 'load_errors': 0}
+
+    @staticmethod
+    def make_key(query, max_price, page):
+        return (normalize_query(query), max_price, int(page))
+
+    def get_or_load(self, key, loader):
+        """
+        Return (value, status) with status 'hit', 'stale', 'miss' or 'coalesced'.
+        loader() returns (value, ttl); ttl overrides the default TTL and a ttl of 0 skips caching.
+        Loader exceptions propagate to every caller waiting on that load.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                if now < entry.fresh_until:
+                    self._stats['hits'] += 1
+                    return entry.value, 'hit'
+                self._stats['stale_hits'] += 1
+                if key not in self._inflight:
+                    self._inflight[key] = Future()
+                    self._stats['refreshes'] += 1
+                    self._refresher.submit(self._load, key, loader, self._inflight[key])
+                return entry.value, 'stale'
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                status = 'coalesced'
+            else:
+                future = self._inflight[key] = Future()
+                self._stats['misses'] += 1
+                status = 'miss'
+
+        if status == 'miss':
+            self._load(key, loader, future)
+        return future.result(), status
+
+    def claim(self, key):
+        """
+        Single-flight for loads that can't run inside get_or_load (e.g. results streamed per site).
+        Returns (value, 'hit') for a fresh entry, (future, 'coalesced') for a load already in flight,
+        or (future, 'miss'): the caller now owns the load and must end it with finish_load().
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry.value, 'hit'
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                return future, 'coalesced'
+            future = self._inflight[key] = Future()
+            self._stats['misses'] += 1
+            return future, 'miss'
+
+    def finish_load(self, key, future, value=None, ttl=None, error=None):
+        """End a claimed load: cache value (ttl as in put()) and hand it to waiters, or pass them error"""
+        with self._lock:
+            if error is not None:
+                self._stats['load_errors'] += 1
+            else:
+                if ttl is None:
+                    ttl = self.ttl
+                if ttl > 0:
+                    self._store(key, value, ttl)
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def peek(self, key):
+        """Return a fresh cached value without loading, or None (counted as a miss)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now >= entry.fresh_until:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry.value
+
+    def contains(self, key):
+        """Whether a fresh entry exists for key (no stats, no LRU touch)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() < entry.fresh_until
+
+    def put(self, key, value, ttl=None):
+        """Store a value computed outside get_or_load; ttl None uses the default, 0 skips caching"""
+        if ttl is None:
+            ttl = self.ttl
+        if ttl > 0:
+            with self._lock:
+                self._store(key, value, ttl)
+
+    def _load(self, key, loader, future):
+        try:
+            value, ttl = loader()
+        except BaseException as e:
+            self.finish_load(key, future, error=e)
+            return
+        self.finish_load(key, future, value, ttl)
+
+    def _store(self, key, value, ttl):
+        now = time.monotonic()
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        size = estimate_size(value)
+        self._entries[key] = _Entry(value, size, now + ttl, now + ttl + self.stale_ttl)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['inflight'] = len(self._inflight)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = (stats['hits'] + stats['stale_hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
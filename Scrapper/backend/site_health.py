@@ -0,0 +1,152 @@
+"""Per-site health for the scrapers: circuit breaker plus timeouts adapted from observed latency"""
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))]
+
+
+class SiteHealth:
+    """
+    Circuit breaker for one retailer.
+    - closed: requests go through; `failure_threshold` consecutive failures (errors, timeouts or
+      pages where the selectors found nothing) open the circuit.
+    - open: the site is skipped for `cooldown` seconds, doubling after every failed probe up to
+      `max_cooldown`.
+    - half_open: after the cooldown one probe request is let through; success closes the circuit,
+      failure re-opens it.
+    The request timeout is `timeout_multiplier` x p95 of recent successful fetch latencies, clamped
+    to [min_timeout, max_timeout]; max_timeout until `min_samples` latencies have been seen.
+    """
+
+    def __init__(self, name, failure_threshold=3, cooldown=30, max_cooldown=300, min_timeout=2.0,
+                 max_timeout=15.0, timeout_multiplier=2.0, min_samples=10, window=100):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.probe_started = 0.0
+        self.last_error = None
+        self.counts = {'success': 0, 'error': 0, 'empty': 0, 'skipped': 0, 'throttled': 0}
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Whether to scrape the site now; in half-open state only one probe at a time is allowed"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() >= self.open_until:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+                print(f"[SiteHealth] {self.name} half-open, probing")
+            # A probe that never reported back (e.g. cancelled before it ran) doesn't block the next one
+            probe_lost = time.monotonic() - self.probe_started > 2 * self.max_timeout
+            if self.state == HALF_OPEN and (not self.probe_in_flight or probe_lost):
+                self.probe_in_flight = True
+                self.probe_started = time.monotonic()
+                return True
+            self.counts['skipped'] += 1
+            return False
+
+    def timeout(self):
+        """Request timeout (seconds) from recent latencies"""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return self.max_timeout
+            adaptive = percentile(self.latencies, 95) * self.timeout_multiplier
+        return min(self.max_timeout, max(self.min_timeout, adaptive))
+
+    def record_success(self, latency_s):
+        with self._lock:
+            self.latencies.append(latency_s)
+            self.counts['success'] += 1
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                print(f"[SiteHealth] {self.name} recovered, circuit closed")
+            self.state = CLOSED
+            self.cooldown = self.base_cooldown
+            self.probe_in_flight = False
+
+    def record_failure(self, reason, empty=False):
+        """An error/timeout, or (empty=True) a page where the selectors extracted nothing"""
+        with self._lock:
+            self.counts['empty' if empty else 'error'] += 1
+            self.consecutive_failures += 1
+            self.last_error = reason
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._open()
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def record_throttled(self):
+        """Our own rate limiter gave up before the site was asked: no verdict, but a probe slot is freed"""
+        with self._lock:
+            self.counts['throttled'] += 1
+            self.probe_in_flight = False
+
+    def _open(self):
+        self.state = OPEN
+        self.open_until = time.monotonic() + self.cooldown
+        self.probe_in_flight = False
+        print(f"[SiteHealth] {self.name} circuit open for {self.cooldown}s after {self.consecutive_failures} failures ({self.last_error})")
+
+    def snapshot(self):
+        timeout = self.timeout()
+        with self._lock:
+            latencies = list(self.latencies)
+            snapshot = {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'timeout_s': round(timeout, 3),
+                'last_error': self.last_error,
+                'counts': dict(self.counts),
+            }
+            if self.state == OPEN:
+                snapshot['retry_in_s'] = round(max(0.0, self.open_until - time.monotonic()), 1)
+        if latencies:
+            snapshot['latency_ms'] = {
+                'p50': int(percentile(latencies, 50) * 1000),
+                'p95': int(percentile(latencies, 95) * 1000),
+                'samples': len(latencies),
+            }
+        return snapshot
+
+
+class SiteHealthRegistry:
+    """SiteHealth per site name, created on first use with shared settings"""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            health = self._sites.get(name)
+            if health is None:
+                health = self._sites[name] = SiteHealth(name, **self.settings)
+            return health
+
+    def snapshot(self):
+        with self._lock:
+            sites = list(self._sites.values())
+        return {health.name: health.snapshot() for health in sites}
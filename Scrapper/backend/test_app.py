@@ -0,0 +1,63 @@
+"""
+Catalog mode of /search, against the replay server's saved result pages.
+Run: cd Scrapper/backend && python -m pytest -q
+"""
+import os
+import tempfile
+from functools import partial
+
+import pytest
+
+# Keep test scrapes out of the real product catalog
+os.environ.setdefault('CATALOG_PATH', os.path.join(tempfile.mkdtemp(prefix='test-catalog-'), 'catalog.db'))
+
+import app as scraper_app
+from replay_server import replay_specs, start_replay_server
+
+
+@pytest.fixture(scope='module')
+def client():
+    server, base_url = start_replay_server()
+    scrapers = scraper_app.SCRAPERS
+    scraper_app.SCRAPERS = [(spec['name'], partial(scraper_app.scrape_site, spec)) for spec in replay_specs(base_url)]
+    yield scraper_app.app.test_client()
+    scraper_app.SCRAPERS = scrapers
+    server.shutdown()
+
+
+def search(client, query, budget, mode='live'):
+    response = client.post('/search', json={'query': query, 'budget': budget, 'mode': mode})
+    assert response.status_code == 200
+    # Catalog writes are queued on one background thread
+    scraper_app.catalog_writer.submit(lambda: None).result()
+    return response.get_json()
+
+
+def test_catalog_replays_a_recent_live_search(client):
+    live = search(client, 'joggers', 'mid-range')
+
+    replayed = search(client, 'Joggers', 'mid-range', mode='catalog')
+
+    assert replayed['source'] == 'catalog'
+    assert replayed['products'] == live['products']
+
+
+def test_catalog_answers_other_queries_from_the_full_text_index(client):
+    search(client, 'joggers', 'premium')
+
+    found = search(client, 'striped cotton', 'mid-range', mode='catalog')
+
+    assert found['source'] == 'catalog'
+    # Myntra's title is only the brand; its product name is indexed too
+    assert {product['source'] for product in found['products']} >= {'Flipkart', 'Myntra'}
+    for product in found['products']:
+        text = f"{product['title']} {product.get('name', '')}".lower()
+        assert 'striped' in text and 'cotton' in text
+        if product['source'] != 'Amazon':
+            assert product['price_value'] <= 3000
+
+
+def test_catalog_falls_back_to_live_without_matches(client):
+    result = search(client, 'zzzunknownzzz', 'premium', mode='catalog')
+
+    assert result['source'] == 'live'
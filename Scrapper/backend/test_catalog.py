@@ -0,0 +1,58 @@
+"""
+Tests for the local product catalog.
+Run: cd Scrapper/backend && python -m pytest -q
+"""
+import sqlite3
+
+import pytest
+
+from catalog import Catalog
+
+
+def product(title, link, price, source, name=None):
+    item = {'title': title, 'price_value': price, 'link': link, 'image': '', 'source': source}
+    if name:
+        item['name'] = name
+    return item
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = Catalog(str(tmp_path / 'catalog.db'))
+    yield catalog
+    catalog.close()
+
+
+def test_results_replay_the_last_live_listing(catalog):
+    catalog.record_page('Red  Shoes', 1, 'Amazon', [product('B', 'https://a/b', 5000, 'Amazon'), product('A', 'https://a/a', 300, 'Amazon')])
+    catalog.record_page('red shoes', 1, 'Amazon', [product('C', 'https://a/c', 900, 'Amazon'), product('B', 'https://a/b', 4500, 'Amazon')])
+    catalog.record_page('red shoes', 2, 'Amazon', [product('D', 'https://a/d', 100, 'Amazon')])
+    catalog.record_search('red shoes', 1)
+
+    results = catalog.results('RED SHOES', 1)
+
+    assert [(p['link'], p['price_value']) for p in results] == [('https://a/c', 900), ('https://a/b', 4500)]
+    assert catalog.is_fresh('Red Shoes', 1, max_age=60)
+    assert not catalog.is_fresh('red shoes', 2, max_age=60)
+
+
+def test_myntra_product_name_is_searchable(catalog):
+    catalog.record_page('shirt', 1, 'Myntra', [product('Roadster', 'https://m/1', 499, 'Myntra', name='Striped T-shirt')])
+
+    found = catalog.search('striped')
+
+    assert [(p['title'], p['name']) for p in found] == [('Roadster', 'Striped T-shirt')]
+
+
+def test_older_layout_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'catalog.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, link TEXT, title TEXT)')
+    conn.commit()
+    conn.close()
+
+    catalog = Catalog(path)
+    catalog.upsert([product('Roadster', 'https://m/1', 499, 'Myntra', name='Striped T-shirt')])
+
+    assert catalog.stats()['products'] == 1
+    catalog.close()
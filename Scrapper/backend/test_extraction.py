@@ -0,0 +1,74 @@
+"""
+Regression tests for the selector cascades in extraction.py.
+Run: cd Scrapper/backend && python -m pytest -q
+"""
+from extraction import SPECS_BY_NAME, extract_products
+from replay_server import load_pages
+
+AMAZON = SPECS_BY_NAME['Amazon']
+MYNTRA = SPECS_BY_NAME['Myntra']
+
+
+def amazon_item(title, href, price_html, image_html=''):
+    return (
+        '<div data-component-type="s-search-result">'
+        f'<h2 class="a-size-mini"><a class="a-link-normal" href="{href}">{title}</a></h2>'
+        f'{price_html}{image_html}</div>'
+    )
+
+
+FULL_PRICE = (
+    '<span class="a-price"><span class="a-offscreen">₹1,299</span>'
+    '<span aria-hidden="true"><span class="a-price-symbol">₹</span>'
+    '<span class="a-price-whole">1,299</span></span></span>'
+)
+
+
+def test_price_wrapper_fallback_does_not_take_over_the_page():
+    # The first item only has the span.a-price wrapper; the rest have the full markup, where that
+    # wrapper's text is "₹1,299₹1,299"
+    html = amazon_item('Plain', '/plain', '<span class="a-price">₹499</span>')
+    html += ''.join(amazon_item(f'Full {i}', f'/full{i}', FULL_PRICE) for i in range(3))
+
+    prices = [p['price_value'] for p in extract_products(AMAZON, html)]
+
+    assert prices == [499, 1299, 1299, 1299]
+
+
+def test_catch_all_image_selector_is_never_promoted():
+    html = amazon_item('Bare', '/bare', FULL_PRICE, '<img src="bare.jpg">')
+    html += amazon_item('Badged', '/badged', FULL_PRICE, '<img src="badge.png"><img class="s-image" src="product.jpg">')
+
+    images = [p['image'] for p in extract_products(AMAZON, html)]
+
+    assert images == ['bare.jpg', 'product.jpg']
+
+
+def test_selector_preference_does_not_leak_across_pages():
+    name_only = (
+        '<li class="product-base"><a href="tshirts/1">'
+        '<h4 class="product-product">Printed T-shirt</h4>'
+        '<span class="product-discountedPrice">Rs. 499</span></a></li>'
+    )
+    with_brand = (
+        '<li class="product-base"><a href="tshirts/2">'
+        '<h3 class="product-brand">Roadster</h3><h4 class="product-product">Striped T-shirt</h4>'
+        '<span class="product-discountedPrice">Rs. 599</span></a></li>'
+    )
+
+    extract_products(MYNTRA, name_only * 3)
+    products = extract_products(MYNTRA, with_brand)
+
+    assert [p['title'] for p in products] == ['Roadster']
+
+
+def test_fixture_pages_extract_every_container():
+    pages = load_pages()
+    for spec in SPECS_BY_NAME.values():
+        html = pages.get(spec['name'].lower())
+        if html is None:
+            continue
+        stats = {}
+        products = extract_products(spec, html, stats=stats)
+        assert products and stats['extracted'] == stats['found'] == len(products)
+        assert all(p['link'].startswith('http') for p in products)
@@ -0,0 +1,282 @@
+"""
+Scalability benchmarks for the opponent matcher.
+Generates synthetic users with realistic style-preference distributions and reports, per user
+count and backend: encode time, fit/build time, per-query and batch-query latency percentiles
+and peak traced memory. Results are written as JSON so runs can be diffed between releases.
+
+Run: cd backend/opponent_matching && python bench_matcher.py --sizes 1000 10000 100000 --output bench.json
+"""
+
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from knn_matcher import (
+    STYLE_OPTIONS,
+    BitPackedMatcher,
+    DedupOpponentIndex,
+    OpponentIndex,
+    build_id_index,
+    build_knn_model,
+    match_opponents,
+    prepare_features,
+)
+
+BACKENDS = [
+    "sklearn-brute",
+    "sklearn-kd_tree",
+    "sklearn-ball_tree",
+    "opponent-index",
+    "bitpacked",
+    "dedup",
+]
+
+# Style "personas": users mostly pick styles that co-occur, plus a few globally popular ones
+_PERSONAS = [
+    ["Streetwear", "Urban", "Y2K", "Edgy", "Grunge"],
+    ["Minimalist", "Classic", "Formal", "Preppy"],
+    ["Sporty", "Athleisure", "Casual", "Techwear"],
+    ["Bohemian", "Romantic", "Vintage", "Artsy", "Coastal", "Sustainable"],
+    ["High Fashion", "Minimalist", "Edgy", "Formal"],
+]
+_PERSONA_WEIGHTS = [0.35, 0.2, 0.25, 0.12, 0.08]
+# Zipf-like global popularity in STYLE_OPTIONS order (Streetwear/Minimalist/Casual lead)
+_GLOBAL_POPULARITY = np.array([1.0 / (rank + 1) for rank in range(len(STYLE_OPTIONS))])
+_GLOBAL_POPULARITY[[0, 1, 7]] = [1.0, 0.9, 0.95]
+_GLOBAL_POPULARITY /= _GLOBAL_POPULARITY.sum()
+
+
+def generate_users(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic users in the get_mock_users layout.
+    Gender ~ 45/45/10, ages skewed to 16-35, 1-5 styles drawn 80% from a persona and 20% from
+    global popularity, so identical profiles and style clusters occur as in real onboarding data.
+    """
+    rng = np.random.default_rng(seed)
+    gender = rng.choice(["male", "female", "other"], size=n, p=[0.45, 0.45, 0.1])
+    age = np.clip(np.rint(rng.gamma(shape=9.0, scale=2.6, size=n) + 2), 13, 80).astype(int)
+
+    n_styles = rng.choice([1, 2, 3, 4, 5], size=n, p=[0.15, 0.3, 0.3, 0.15, 0.1])
+    persona = rng.choice(len(_PERSONAS), size=n, p=_PERSONA_WEIGHTS)
+    from_persona = rng.random((n, 5)) < 0.8
+    global_pick = rng.choice(len(STYLE_OPTIONS), size=(n, 5), p=_GLOBAL_POPULARITY)
+    persona_slot = rng.integers(0, 1 << 30, size=(n, 5))
+
+    preferences = []
+    for i in range(n):
+        styles = _PERSONAS[persona[i]]
+        prefs = []
+        for slot in range(n_styles[i]):
+            if from_persona[i, slot]:
+                prefs.append(styles[persona_slot[i, slot] % len(styles)])
+            else:
+                prefs.append(STYLE_OPTIONS[global_pick[i, slot]])
+        preferences.append(list(dict.fromkeys(prefs)))
+
+    return pd.DataFrame({
+        "user_id": [f"u{i}" for i in range(n)],
+        "gender": gender,
+        "age": age,
+        "preferences": preferences,
+    })
+
+
+def _measure(fn: Callable[[], object]) -> Tuple[object, float, int]:
+    """
+    Run fn twice; return (result of the first run, its seconds, peak traced bytes of the second).
+    tracemalloc slows allocation-heavy code several-fold, so time and memory come from separate runs.
+    """
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    if arr.size == 0:
+        return {}
+    return {
+        "p50": float(np.percentile(arr, 50)),
+        "p90": float(np.percentile(arr, 90)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+        "mean": float(arr.mean()),
+    }
+
+
+def _time_each(fn: Callable[[object], object], items) -> List[float]:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def bench_backend(
+    backend: str,
+    users_df: pd.DataFrame,
+    feature_df: pd.DataFrame,
+    X_weighted: np.ndarray,
+    query_ids: List[str],
+    batches: List[List[str]],
+    k: int,
+) -> Dict[str, object]:
+    """Fit one backend on prepared data and time single and batch queries."""
+    if backend.startswith("sklearn-"):
+        algorithm = backend.split("-", 1)[1]
+        model, fit_s, fit_peak = _measure(lambda: build_knn_model(X_weighted, algorithm=algorithm))
+        id_index = build_id_index(feature_df)
+
+        def query(uid):
+            return match_opponents(uid, k, feature_df, X_weighted, model)
+
+        def batch_query(ids):
+            pos = np.array([id_index[uid] for uid in ids], dtype=np.intp)
+            return model.kneighbors(X_weighted[pos], n_neighbors=min(k + 1, X_weighted.shape[0]))
+
+    elif backend == "opponent-index":
+        index, fit_s, fit_peak = _measure(lambda: OpponentIndex.from_users(users_df))
+
+        def query(uid):
+            return index.kneighbors(uid, k)
+
+        def batch_query(ids):
+            return index.kneighbors_batch(ids, k)
+
+    elif backend == "bitpacked":
+        index, fit_s, fit_peak = _measure(lambda: BitPackedMatcher.from_users(users_df))
+
+        def query(uid):
+            return index.kneighbors(uid, k)
+
+        def batch_query(ids):
+            return index.kneighbors_batch(ids, k)
+
+    elif backend == "dedup":
+        user_ids = feature_df["user_id"].astype(str).to_numpy(dtype=object)
+        index, fit_s, fit_peak = _measure(lambda: DedupOpponentIndex(user_ids, X_weighted))
+
+        def query(uid):
+            return index.kneighbors(uid, k)
+
+        def batch_query(ids):
+            return [index.kneighbors(uid, k) for uid in ids]
+
+    else:
+        raise ValueError(f"Unknown backend: {backend!r}")
+
+    query_ms = _time_each(query, query_ids)
+    batch_ms = _time_each(batch_query, batches)
+    result = {
+        "backend": backend,
+        "fit_s": fit_s,
+        "fit_peak_bytes": fit_peak,
+        "query_ms": _percentiles(query_ms),
+        "batch_ms": _percentiles(batch_ms),
+        "batch_size": len(batches[0]) if batches else 0,
+    }
+    if backend == "bitpacked":
+        result["index_bytes"] = index.nbytes
+    elif backend == "dedup":
+        result["n_distinct"] = index.n_distinct
+    return result
+
+
+def run_benchmarks(
+    sizes: List[int],
+    backends: List[str],
+    n_queries: int = 100,
+    batch_size: int = 256,
+    n_batches: int = 5,
+    k: int = 5,
+    seed: int = 0,
+    log: Optional[Callable[[str], None]] = print,
+) -> Dict[str, object]:
+    """Run every backend at every size; returns the JSON-ready report."""
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in sizes:
+        users_df = generate_users(n, seed=seed)
+        (feature_df, X_weighted, _), encode_s, encode_peak = _measure(lambda: prepare_features(users_df))
+        all_ids = users_df["user_id"].tolist()
+        query_ids = [all_ids[i] for i in rng.integers(0, n, size=n_queries)]
+        batches = [[all_ids[i] for i in rng.integers(0, n, size=batch_size)] for _ in range(n_batches)]
+
+        for backend in backends:
+            result = bench_backend(backend, users_df, feature_df, X_weighted, query_ids, batches, k)
+            result.update({
+                "n_users": n,
+                "encode_s": encode_s,
+                "encode_peak_bytes": encode_peak,
+                "feature_bytes": int(X_weighted.nbytes),
+            })
+            results.append(result)
+            if log:
+                log(
+                    f"[Bench] n={n:>8} {backend:<18} encode={encode_s:8.3f}s fit={result['fit_s']:8.3f}s "
+                    f"query p50={result['query_ms'].get('p50', 0):8.3f}ms p99={result['query_ms'].get('p99', 0):8.3f}ms "
+                    f"batch p50={result['batch_ms'].get('p50', 0):9.3f}ms peak={result['fit_peak_bytes'] / 2**20:8.1f}MiB"
+                )
+
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "machine": platform.machine(),
+            "n_queries": n_queries,
+            "batch_size": batch_size,
+            "n_batches": n_batches,
+            "k": k,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Opponent matcher scalability benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--queries", type=int, default=100, help="single-user queries per backend")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_matcher.json", help="JSON results path")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        args.sizes,
+        args.backends,
+        n_queries=args.queries,
+        batch_size=args.batch_size,
+        n_batches=args.batches,
+        k=args.k,
+        seed=args.seed,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[Bench] Wrote {len(report['results'])} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,21 @@ KNN-based opponent matching for outfit battle page.
 Matches users by gender, age (normalized), and style preference (one-hot) with feature weighting.
 """
 
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+
 import numpy as np
 import pandas as pd
+from scipy.sparse import issparse
 from sklearn.neighbors import NearestNeighbors
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
 
 # ---------------------------------------------------------------------------
 # Constants: align with onboarding FASHION_PREFERENCES (order must be fixed)
@@ -26,63 +37,121 @@ WEIGHT_GENDER = 0.5
 WEIGHT_AGE = 0.5
 WEIGHT_STYLE = 2.0  # higher = style has more importance in Euclidean distance
 
+# Lowercase style name -> position in STYLE_OPTIONS (case-insensitive preference lookup)
+_STYLE_LOOKUP = {s.lower(): i for i, s in enumerate(STYLE_OPTIONS)}
+
+# Upper bound on the distance block held in memory by match_opponents_batch (bytes)
+_BATCH_WORKING_MEMORY = 64 * 1024 * 1024
+
+# Width of the age buckets OpponentIndex partitions rows by (years)
+AGE_PARTITION_YEARS = 5
+
+
+def _encode_gender(gender: pd.Series) -> pd.Series:
+    """Gender codes (0/1/2); unknown or missing values fall back to "other"."""
+    gender_encoded = gender.str.lower().map(GENDER_MAP)
+    if gender_encoded.isna().any():
+        gender_encoded = gender_encoded.fillna(GENDER_MAP["other"])
+    return gender_encoded.astype(int)
+
 
-def prepare_features(users_df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray, List[str]]:
+def _encode_styles(preferences: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Map each user's preference list to STYLE_OPTIONS column positions in one batched pass.
+    Returns (row_positions, style_positions) of the set bits of the multi-hot style block.
+    A bare string is not a preference list: it sets no style (as iterating its characters always did).
+    """
+    preferences = preferences.reset_index(drop=True)
+    preferences = preferences.mask(preferences.map(lambda p: isinstance(p, str)))
+    exploded = preferences.explode().dropna()
+    if exploded.empty:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    # Match case-insensitively to STYLE_OPTIONS via the precomputed lookup
+    style_pos = exploded.astype(str).str.strip().str.lower().map(_STYLE_LOOKUP).dropna()
+    # A style listed twice still sets a single bit
+    flat = np.unique(style_pos.index.to_numpy(dtype=np.intp) * len(STYLE_OPTIONS) + style_pos.to_numpy(dtype=np.intp))
+    return np.divmod(flat, len(STYLE_OPTIONS))
+
+
+def prepare_features(
+    users_df: pd.DataFrame,
+    dtype: type = np.float64,
+    sparse: bool = False,
+) -> Tuple[pd.DataFrame, Union[np.ndarray, "csr_matrix"], List[str]]:
     """
     Prepare feature matrix from raw user data.
     - Encodes gender (0/1/2), normalizes age (age/100), one-hot encodes styles.
+    - dtype sets the precision of the weighted matrix (e.g. np.float32 halves its memory).
+    - sparse=True returns the weighted matrix as a scipy CSR matrix instead of a dense array.
     - Returns (feature_df, weighted_matrix, style_column_names).
     """
-    # 1) Encode gender
-    gender_encoded = users_df["gender"].str.lower().map(GENDER_MAP)
-    if gender_encoded.isna().any():
-        gender_encoded = gender_encoded.fillna(GENDER_MAP["other"])
+    n = len(users_df)
     users_df = users_df.copy()
-    users_df["gender_enc"] = gender_encoded.astype(int)
+
+    # 1) Encode gender
+    users_df["gender_enc"] = _encode_gender(users_df["gender"])
 
     # 2) Normalize age: divide by 100, clip to [0, 1] for sanity
     users_df["age_norm"] = (users_df["age"] / 100.0).clip(0.0, 1.0)
 
     # 3) One-hot encode style preference (styles users chose in onboarding)
     style_columns = [f"style_{s}" for s in STYLE_OPTIONS]
-    for col in style_columns:
-        users_df[col] = 0
-
-    for idx, row in users_df.iterrows():
-        prefs = row.get("preferences") or []
-        for p in prefs:
-            # Match case-insensitively to STYLE_OPTIONS
-            pnorm = str(p).strip()
-            for style_name in STYLE_OPTIONS:
-                if style_name.lower() == pnorm.lower():
-                    users_df.at[idx, f"style_{style_name}"] = 1
-                    break
+    if "preferences" in users_df.columns:
+        rows, cols = _encode_styles(users_df["preferences"])
+    else:
+        rows = cols = np.empty(0, dtype=np.intp)
+    styles = np.zeros((n, len(STYLE_OPTIONS)), dtype=np.int64)
+    styles[rows, cols] = 1
+    users_df = pd.concat(
+        [
+            users_df.drop(columns=style_columns, errors="ignore"),
+            pd.DataFrame(styles, index=users_df.index, columns=style_columns),
+        ],
+        axis=1,
+    )
 
     # 4) Build numeric feature matrix: [gender_enc, age_norm, ...style_one_hot...]
+    #    with feature weighting applied so Euclidean distance reflects importance
+    #    (weighted Euclidean = Euclidean on scaled features)
     feature_cols = ["gender_enc", "age_norm"] + style_columns
-    X = users_df[feature_cols].values.astype(np.float64)
+    gender_col = users_df["gender_enc"].to_numpy(dtype=dtype) * dtype(WEIGHT_GENDER)
+    age_col = users_df["age_norm"].to_numpy(dtype=dtype) * dtype(WEIGHT_AGE)
 
-    # 5) Apply feature weighting so Euclidean distance reflects importance
-    #    Scale each dimension: weighted Euclidean = Euclidean on scaled features
-    weights = np.array(
-        [WEIGHT_GENDER, WEIGHT_AGE] + [WEIGHT_STYLE] * len(style_columns),
-        dtype=np.float64,
-    )
-    X_weighted = X * weights
+    if sparse:
+        from scipy.sparse import csr_matrix
+
+        # Style bits are placed directly, so the dense style block is never materialized as floats
+        all_rows = np.concatenate([np.arange(n), np.arange(n), rows])
+        all_cols = np.concatenate([np.zeros(n, dtype=np.intp), np.ones(n, dtype=np.intp), cols + 2])
+        data = np.concatenate([gender_col, age_col, np.full(len(rows), WEIGHT_STYLE, dtype=dtype)])
+        X_weighted = csr_matrix((data, (all_rows, all_cols)), shape=(n, len(feature_cols)), dtype=dtype)
+        X_weighted.eliminate_zeros()
+        return users_df, X_weighted, feature_cols
+
+    X_weighted = np.empty((n, len(feature_cols)), dtype=dtype)
+    X_weighted[:, 0] = gender_col
+    X_weighted[:, 1] = age_col
+    np.multiply(styles, WEIGHT_STYLE, out=X_weighted[:, 2:], casting="unsafe")
 
     return users_df, X_weighted, feature_cols
 
 
-def build_knn_model(X_weighted: np.ndarray, metric: str = "euclidean") -> NearestNeighbors:
+def build_knn_model(
+    X_weighted: np.ndarray,
+    metric: str = "euclidean",
+    algorithm: str = "auto",
+) -> NearestNeighbors:
     """
     Build and fit a KNN model using (weighted) Euclidean distance.
+    algorithm is passed to sklearn ("auto", "brute", "kd_tree", "ball_tree").
     """
     # Request up to n neighbors so match_opponents can ask for k+1 (self + k others)
     n = X_weighted.shape[0]
     n_neighbors = max(1, n)
     model = NearestNeighbors(
         n_neighbors=n_neighbors,
-        algorithm="auto",
+        algorithm=algorithm,
         metric=metric,
     )
     # Note: kneighbors() can request fewer neighbors when querying
@@ -97,10 +166,16 @@ def match_opponents(
     X_weighted: np.ndarray,
     knn_model: NearestNeighbors,
     id_column: str = "user_id",
+    exclude_ids: Optional[Iterable[str]] = None,
+    allowed_ids: Optional[Iterable[str]] = None,
+    same_gender: bool = False,
+    age_range: Optional[Tuple[float, float]] = None,
 ) -> List[str]:
     """
     Return top K nearest opponent user_ids for the given user_id, excluding the current user.
     Uses Euclidean distance on weighted features (gender, age, style one-hot).
+    Optional filters (see OpponentIndex.kneighbors) restrict the candidate rows before ranking,
+    so up to k matches come back without over-fetching; users_df must come from prepare_features.
     """
     if users_df.empty or k <= 0:
         return []
@@ -117,6 +192,28 @@ def match_opponents(
     else:
         row_pos = int(row_pos)
 
+    if exclude_ids is not None or allowed_ids is not None or same_gender or age_range is not None:
+        allowed = np.ones(len(users_df), dtype=bool)
+        ids = users_df[id_column].astype(str)
+        if exclude_ids is not None:
+            allowed &= ~ids.isin([str(uid) for uid in exclude_ids]).to_numpy()
+        if allowed_ids is not None:
+            allowed &= ids.isin([str(uid) for uid in allowed_ids]).to_numpy()
+        if same_gender:
+            gender_enc = users_df["gender_enc"].to_numpy()
+            allowed &= gender_enc == gender_enc[row_pos]
+        if age_range is not None:
+            ages = users_df["age"].to_numpy(dtype=np.float64)
+            allowed &= (ages >= age_range[0]) & (ages <= age_range[1])
+        allowed[row_pos] = False
+        candidates = np.flatnonzero(allowed)
+        query, X_candidates = X_weighted[row_pos : row_pos + 1], X_weighted[candidates]
+        if issparse(X_weighted):
+            # prepare_features(sparse=True): only the filtered rows are densified
+            query, X_candidates = query.toarray(), X_candidates.toarray()
+        sq_dist = squared_distances(query, X_candidates)[0]
+        return [str(uid) for uid in ids.to_numpy()[candidates[_select_top_k(sq_dist, k)]]]
+
     # Query for k+1 neighbors (first is self)
     n_neighbors_request = min(k + 1, X_weighted.shape[0])
     distances, indices = knn_model.kneighbors(
@@ -140,6 +237,876 @@ def match_opponents(
     return opponent_ids
 
 
+def build_id_index(users_df: pd.DataFrame, id_column: str = "user_id") -> Dict[str, int]:
+    """
+    Map each user_id (as str) to its row position in users_df / X_weighted.
+    Build once per prepared dataset and reuse it for every match_opponents_batch call.
+    """
+    return {uid: pos for pos, uid in enumerate(users_df[id_column].astype(str))}
+
+
+def match_opponents_batch(
+    user_ids: Sequence[str],
+    k: int,
+    users_df: pd.DataFrame,
+    X_weighted: np.ndarray,
+    id_index: Optional[Dict[str, int]] = None,
+    id_column: str = "user_id",
+    chunk_size: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top K opponents for many users at once.
+    - Ids are resolved through id_index (see build_id_index) instead of scanning users_df.
+    - Distances are computed for chunk_size query users at a time, so peak memory stays at
+      roughly chunk_size x len(users_df) floats however large the batch is; X_weighted itself is
+      read in place, never copied.
+    - Returns (opponent_ids, distances), both shaped (len(user_ids), k). Rows for unknown ids,
+      and slots beyond the available opponents, hold None / np.inf.
+    """
+    if users_df.empty:
+        return _kneighbors_batch_dense(user_ids, k, np.empty(0, dtype=object), X_weighted[:0], {}, chunk_size)
+    if id_index is None:
+        id_index = build_id_index(users_df, id_column)
+    # Raw ids: only the returned neighbors are converted to str, so a small batch stays O(k)
+    ids = users_df[id_column].to_numpy()
+    return _kneighbors_batch_dense(user_ids, k, ids, X_weighted, id_index, chunk_size)
+
+
+def _kneighbors_batch_dense(
+    user_ids: Sequence[str],
+    k: int,
+    ids: np.ndarray,
+    X_weighted: np.ndarray,
+    id_index: Optional[Dict[str, int]],
+    chunk_size: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Chunked exact top-k over a dense weighted matrix; see match_opponents_batch."""
+    n_queries = len(user_ids)
+    opponent_ids = np.full((n_queries, max(k, 0)), None, dtype=object)
+    distances = np.full((n_queries, max(k, 0)), np.inf, dtype=np.float64)
+    if X_weighted.shape[0] == 0 or k <= 0 or n_queries == 0:
+        return opponent_ids, distances
+
+    query_rows = np.flatnonzero([str(uid) in id_index for uid in user_ids])
+    query_pos = np.array([id_index[str(user_ids[i])] for i in query_rows], dtype=np.intp)
+    neighbor_pos, neighbor_dist = kneighbors_positions(X_weighted, query_pos, k, chunk_size)
+    for row, pos_row, dist_row in zip(query_rows, neighbor_pos, neighbor_dist):
+        found = pos_row >= 0
+        opponent_ids[row, : found.sum()] = [str(uid) for uid in ids[pos_row[found]]]
+        distances[row] = dist_row
+
+    return opponent_ids, distances
+
+
+def kneighbors_positions(
+    X_weighted: np.ndarray,
+    query_pos: np.ndarray,
+    k: int,
+    chunk_size: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k over the rows of X_weighted for the rows at query_pos, excluding each query row.
+    Returns (neighbor_positions, distances) shaped (len(query_pos), k), padded with -1 / np.inf.
+    Works on row positions only, for callers that keep their own id arrays.
+    """
+    n = X_weighted.shape[0]
+    neighbor_pos = np.full((query_pos.shape[0], max(k, 0)), -1, dtype=np.intp)
+    distances = np.full((query_pos.shape[0], max(k, 0)), np.inf, dtype=np.float64)
+    if n == 0 or k <= 0:
+        return neighbor_pos, distances
+
+    k_eff = min(k, n - 1)
+    if chunk_size is None:
+        chunk_size = max(1, _BATCH_WORKING_MEMORY // (n * X_weighted.itemsize))
+
+    norms = _row_norms(X_weighted)
+    for start in range(0, query_pos.shape[0], chunk_size):
+        pos = query_pos[start : start + chunk_size]
+        sq_dist = squared_distances(X_weighted[pos], X_weighted, norms)
+        # Exclude each user from their own results
+        sq_dist[np.arange(pos.shape[0]), pos] = np.inf
+        for row, row_sq_dist in enumerate(sq_dist, start):
+            top = _select_top_k(row_sq_dist, k_eff)
+            neighbor_pos[row, : top.shape[0]] = top
+            distances[row, : top.shape[0]] = np.sqrt(row_sq_dist[top])
+
+    return neighbor_pos, distances
+
+
+def _gender_code(gender) -> int:
+    """Gender code for a single raw value, matching _encode_gender."""
+    gender_enc = GENDER_MAP.get(gender.lower()) if isinstance(gender, str) else None
+    return GENDER_MAP["other"] if gender_enc is None else gender_enc
+
+
+def _age_bucket(age: float) -> int:
+    """Partition bucket for an age (AGE_PARTITION_YEARS wide, clipped to [0, 100]; NaN -> -1)."""
+    if age != age:
+        return -1
+    return int(min(max(age, 0.0), 100.0) // AGE_PARTITION_YEARS)
+
+
+def encode_user(gender, age, preferences, dtype: type = np.float64) -> np.ndarray:
+    """
+    Encode a single user into the weighted feature vector produced by prepare_features.
+    Used for incremental updates where building a one-row DataFrame would dominate the cost.
+    """
+    vec = np.zeros(2 + len(STYLE_OPTIONS), dtype=dtype)
+    vec[0] = _gender_code(gender) * WEIGHT_GENDER
+    vec[1] = min(max(float(age) / 100.0, 0.0), 1.0) * WEIGHT_AGE
+    for p in preferences or []:
+        pos = _STYLE_LOOKUP.get(str(p).strip().lower())
+        if pos is not None:
+            vec[2 + pos] = WEIGHT_STYLE
+    return vec
+
+
+def _row_norms(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (norms, age) of a weighted matrix for squared_distances: gender² + |style|² per row and a
+    contiguous copy of the age column. Two floats per row, so callers scoring many chunks compute
+    them once.
+    """
+    norms = np.square(X[:, 0])
+    norms += np.einsum("ij,ij->i", X[:, 2:], X[:, 2:])
+    return norms, np.ascontiguousarray(X[:, 1])
+
+
+def squared_distances(
+    Q: np.ndarray,
+    X: np.ndarray,
+    norms: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> np.ndarray:
+    """
+    Squared weighted Euclidean distances between dense query rows Q and rows of X (both weighted
+    matrices from prepare_features), shape (len(Q), len(X)).
+    Gender and the binary style block go through |q|² + |x|² - 2q·x, which is exact there because
+    gender codes and style bits only ever sum multiples of 1/4; age is differenced directly and
+    added last. The product runs against whole rows of X in place (the queries' age weight is
+    zeroed), so X is never copied. norms, if given, is _row_norms(X) precomputed by the caller.
+    """
+    x_norms, x_age = _row_norms(X) if norms is None else norms
+    q_rows = np.multiply(Q, -2.0, dtype=np.result_type(Q.dtype, X.dtype))
+    q_rows[:, 1] = 0.0
+    sq_dist = q_rows @ X.T
+    sq_dist += _row_norms(Q)[0][:, None]
+    sq_dist += x_norms
+    diff = np.subtract(Q[:, 1:2], x_age)
+    np.square(diff, out=diff)
+    sq_dist += diff
+    return sq_dist
+
+
+def _select_top_k(sq_dist: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k smallest squared distances, nearest first.
+    Equal distances are ordered by position so results are deterministic.
+    """
+    k = min(k, sq_dist.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < sq_dist.shape[0]:
+        candidates = np.argpartition(sq_dist, k - 1)[:k]
+        # Pull in every position tied with the k-th distance so position order decides among them
+        kth = sq_dist[candidates].max()
+        candidates = np.flatnonzero(sq_dist <= kth)
+    else:
+        candidates = np.arange(k)
+    order = np.lexsort((candidates, sq_dist[candidates]))
+    return candidates[order[:k]]
+
+
+class OpponentIndex:
+    """
+    Mutable opponent index that owns the weighted feature matrix and the user_id mapping.
+    Supports single-user upsert/remove without refitting; queries always see the latest state.
+    Removed rows are tombstoned and compacted lazily once they make up half of the matrix.
+    Rows are also partitioned by (gender, AGE_PARTITION_YEARS age bucket) so same-gender and
+    age-window queries only score the partitions that can satisfy them.
+    """
+
+    def __init__(self, capacity: int = 1024, dtype: type = np.float64):
+        self.dtype = dtype
+        self._X = np.zeros((max(1, capacity), 2 + len(STYLE_OPTIONS)), dtype=dtype)
+        self._ids = np.empty(max(1, capacity), dtype=object)
+        self._alive = np.zeros(max(1, capacity), dtype=bool)
+        self._gender = np.zeros(max(1, capacity), dtype=np.int8)
+        self._age = np.zeros(max(1, capacity), dtype=np.float64)
+        self._slots = {}  # user_id -> row slot in _X
+        self._size = 0  # slots in use, including tombstones
+        self._n_dead = 0
+        self._partitions: Dict[Tuple[int, int], set] = {}  # (gender, age bucket) -> live slots
+        self._partition_arrays: Dict[Tuple[int, int], np.ndarray] = {}  # sorted copies, rebuilt on change
+
+    @classmethod
+    def from_users(
+        cls,
+        users_df: pd.DataFrame,
+        id_column: str = "user_id",
+        dtype: type = np.float64,
+    ) -> "OpponentIndex":
+        """Bulk-load an index from a raw user DataFrame (same columns as prepare_features)."""
+        feature_df, X_weighted, _ = prepare_features(users_df, dtype=dtype)
+        index = cls(capacity=len(users_df), dtype=dtype)
+        for user_id, vec, gender_enc, age in zip(
+            users_df[id_column].astype(str), X_weighted, feature_df["gender_enc"], feature_df["age"]
+        ):
+            index._upsert_vector(user_id, vec, gender_enc, float(age))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, user_id) -> bool:
+        return str(user_id) in self._slots
+
+    @property
+    def user_ids(self) -> List[str]:
+        """Live user_ids in row order."""
+        return [str(uid) for uid in self._ids[: self._size][self._alive[: self._size]]]
+
+    def upsert(self, user_id: str, gender, age, preferences) -> None:
+        """Insert a new user or update an existing user's features in place."""
+        vec = encode_user(gender, age, preferences, dtype=self.dtype)
+        self._upsert_vector(str(user_id), vec, _gender_code(gender), float(age))
+
+    def remove(self, user_id: str) -> bool:
+        """Remove a user. Returns False if the user_id is not in the index."""
+        slot = self._slots.pop(str(user_id), None)
+        if slot is None:
+            return False
+        self._unpartition(slot)
+        self._alive[slot] = False
+        self._ids[slot] = None
+        self._n_dead += 1
+        if self._n_dead * 2 > self._size:
+            self.compact()
+        return True
+
+    def compact(self) -> None:
+        """Drop tombstoned rows, keeping live rows in their original order."""
+        if self._n_dead == 0:
+            return
+        live = np.flatnonzero(self._alive[: self._size])
+        n = live.shape[0]
+        self._X[:n] = self._X[live]
+        self._ids[:n] = self._ids[live]
+        self._gender[:n] = self._gender[live]
+        self._age[:n] = self._age[live]
+        self._ids[n : self._size] = None
+        self._alive[:n] = True
+        self._alive[n : self._size] = False
+        self._slots = {uid: slot for slot, uid in enumerate(self._ids[:n])}
+        self._size = n
+        self._n_dead = 0
+        self._partitions = {}
+        self._partition_arrays = {}
+        for slot in range(n):
+            self._partition(slot)
+
+    def kneighbors(
+        self,
+        user_id: str,
+        k: int,
+        exclude_ids: Optional[Iterable[str]] = None,
+        allowed_ids: Optional[Iterable[str]] = None,
+        same_gender: bool = False,
+        age_range: Optional[Tuple[float, float]] = None,
+    ) -> Tuple[List[str], np.ndarray]:
+        """
+        Return (opponent_ids, distances) for the k nearest live users, excluding the user itself.
+        Distances are weighted Euclidean, the same as match_opponents.
+        Filters are applied before ranking, so up to k matches come back without over-fetching:
+        - exclude_ids: never return these users (active battles, recent or blocked opponents)
+        - allowed_ids: only consider these users (e.g. currently online)
+        - same_gender: only users with the same gender code
+        - age_range: only users whose age lies in [min_age, max_age]
+        """
+        slot = self._slots.get(str(user_id))
+        if slot is None or k <= 0:
+            return [], np.empty(0, dtype=self.dtype)
+
+        excluded = [slot] + [self._slots[uid] for uid in map(str, exclude_ids or ()) if uid in self._slots]
+        if not same_gender and age_range is None and allowed_ids is None:
+            # Unconstrained: score the whole matrix in place and mask tombstones/exclusions
+            sq_dist = squared_distances(self._X[slot : slot + 1], self._X[: self._size])[0]
+            sq_dist[~self._alive[: self._size]] = np.inf
+            sq_dist[excluded] = np.inf
+            top = _select_top_k(sq_dist, min(k, len(self._slots) - len(set(excluded))))
+            return [str(uid) for uid in self._ids[top]], np.sqrt(sq_dist[top])
+
+        if same_gender or age_range is not None:
+            candidates = self._partition_candidates(slot, same_gender, age_range)
+        else:
+            candidates = np.flatnonzero(self._alive[: self._size])
+        if allowed_ids is not None:
+            allowed = np.array([self._slots[uid] for uid in map(str, allowed_ids) if uid in self._slots], dtype=np.intp)
+            candidates = candidates[np.isin(candidates, allowed)]
+        candidates = candidates[~np.isin(candidates, excluded)]
+
+        sq_dist = squared_distances(self._X[slot : slot + 1], self._X[candidates])[0]
+        top = _select_top_k(sq_dist, k)
+        return [str(uid) for uid in self._ids[candidates[top]]], np.sqrt(sq_dist[top])
+
+    def kneighbors_batch(
+        self,
+        user_ids: Sequence[str],
+        k: int,
+        exclude_ids: Optional[Iterable[str]] = None,
+        allowed_ids: Optional[Iterable[str]] = None,
+        same_gender: bool = False,
+        age_range: Optional[Tuple[float, float]] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        kneighbors for many users at once: the filters are resolved to one candidate set (one per
+        gender with same_gender) and each chunk of queries is scored with a single matrix product.
+        Same contract and output as match_opponents_batch; results equal per-user kneighbors.
+        """
+        n_queries = len(user_ids)
+        opponent_ids = np.full((n_queries, max(k, 0)), None, dtype=object)
+        distances = np.full((n_queries, max(k, 0)), np.inf, dtype=np.float64)
+        query_rows = np.array([i for i, uid in enumerate(user_ids) if str(uid) in self._slots], dtype=np.intp)
+        if k <= 0 or query_rows.shape[0] == 0:
+            return opponent_ids, distances
+        query_slots = np.array([self._slots[str(user_ids[i])] for i in query_rows], dtype=np.intp)
+
+        # Rows any query may be matched with
+        allowed = self._alive[: self._size].copy()
+        allowed[[self._slots[uid] for uid in map(str, exclude_ids or ()) if uid in self._slots]] = False
+        if allowed_ids is not None:
+            listed = np.zeros(self._size, dtype=bool)
+            listed[[self._slots[uid] for uid in map(str, allowed_ids) if uid in self._slots]] = True
+            allowed &= listed
+        if age_range is not None:
+            ages = self._age[: self._size]
+            allowed &= (ages >= age_range[0]) & (ages <= age_range[1])
+
+        if same_gender:
+            genders = self._gender[query_slots]
+            groups = [
+                (query_rows[genders == g], query_slots[genders == g], allowed & (self._gender[: self._size] == g))
+                for g in np.unique(genders)
+            ]
+        else:
+            groups = [(query_rows, query_slots, allowed)]
+
+        for rows, slots, mask in groups:
+            candidates = np.flatnonzero(mask)
+            if candidates.shape[0] == 0:
+                continue
+            X_candidates = self._X[candidates]
+            norms = _row_norms(X_candidates)
+            # Where each query sits among the candidates, if it does, so it can be excluded
+            own = np.minimum(np.searchsorted(candidates, slots), candidates.shape[0] - 1)
+            is_candidate = candidates[own] == slots
+            step = chunk_size or max(1, _BATCH_WORKING_MEMORY // (candidates.shape[0] * X_candidates.itemsize))
+            for start in range(0, rows.shape[0], step):
+                sq_dist = squared_distances(self._X[slots[start : start + step]], X_candidates, norms)
+                chunk_own, chunk_is_candidate = own[start : start + step], is_candidate[start : start + step]
+                sq_dist[np.flatnonzero(chunk_is_candidate), chunk_own[chunk_is_candidate]] = np.inf
+                for row, row_sq_dist, excluded in zip(rows[start : start + step], sq_dist, chunk_is_candidate):
+                    top = _select_top_k(row_sq_dist, min(k, candidates.shape[0] - int(excluded)))
+                    opponent_ids[row, : top.shape[0]] = [str(uid) for uid in self._ids[candidates[top]]]
+                    distances[row, : top.shape[0]] = np.sqrt(row_sq_dist[top])
+
+        return opponent_ids, distances
+
+    def match(self, user_id: str, k: int, **filters) -> List[str]:
+        """Top K opponent user_ids for user_id; same contract as match_opponents (filters as in kneighbors)."""
+        opponent_ids, _ = self.kneighbors(user_id, k, **filters)
+        return opponent_ids
+
+    def _partition_candidates(
+        self,
+        slot: int,
+        same_gender: bool,
+        age_range: Optional[Tuple[float, float]],
+    ) -> np.ndarray:
+        """Sorted live slots from the partitions that can satisfy the gender/age constraints."""
+        genders = [int(self._gender[slot])] if same_gender else sorted(GENDER_MAP.values())
+        if age_range is None:
+            buckets = None
+        else:
+            buckets = range(_age_bucket(age_range[0]), _age_bucket(age_range[1]) + 1)
+        parts = [
+            self._partition_array(key)
+            for key in self._partitions
+            if key[0] in genders and (buckets is None or key[1] in buckets)
+        ]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        candidates = np.sort(np.concatenate(parts))
+        if age_range is not None:
+            # Buckets are coarse; apply the exact window on the few boundary rows
+            ages = self._age[candidates]
+            candidates = candidates[(ages >= age_range[0]) & (ages <= age_range[1])]
+        return candidates
+
+    def _partition_array(self, key: Tuple[int, int]) -> np.ndarray:
+        arr = self._partition_arrays.get(key)
+        if arr is None:
+            arr = np.fromiter(self._partitions[key], dtype=np.intp, count=len(self._partitions[key]))
+            self._partition_arrays[key] = arr
+        return arr
+
+    def _partition(self, slot: int) -> None:
+        key = (int(self._gender[slot]), _age_bucket(self._age[slot]))
+        self._partitions.setdefault(key, set()).add(slot)
+        self._partition_arrays.pop(key, None)
+
+    def _unpartition(self, slot: int) -> None:
+        key = (int(self._gender[slot]), _age_bucket(self._age[slot]))
+        members = self._partitions.get(key)
+        if members is not None:
+            members.discard(slot)
+            if not members:
+                del self._partitions[key]
+            self._partition_arrays.pop(key, None)
+
+    def _upsert_vector(self, user_id: str, vec: np.ndarray, gender_enc: int, age: float) -> None:
+        slot = self._slots.get(user_id)
+        if slot is None:
+            if self._size == self._X.shape[0]:
+                self._grow()
+            slot = self._size
+            self._size += 1
+            self._slots[user_id] = slot
+            self._ids[slot] = user_id
+            self._alive[slot] = True
+        else:
+            self._unpartition(slot)
+        self._X[slot] = vec
+        self._gender[slot] = gender_enc
+        self._age[slot] = age
+        self._partition(slot)
+
+    def _grow(self) -> None:
+        # Doubling keeps appends O(1) amortized
+        capacity = self._X.shape[0] * 2
+        X = np.zeros((capacity, self._X.shape[1]), dtype=self.dtype)
+        X[: self._size] = self._X[: self._size]
+        ids = np.empty(capacity, dtype=object)
+        ids[: self._size] = self._ids[: self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        gender = np.zeros(capacity, dtype=np.int8)
+        gender[: self._size] = self._gender[: self._size]
+        age = np.zeros(capacity, dtype=np.float64)
+        age[: self._size] = self._age[: self._size]
+        self._X, self._ids, self._alive, self._gender, self._age = X, ids, alive, gender, age
+
+
+class DedupOpponentIndex:
+    """
+    Opponent index over distinct weighted feature vectors.
+    Users sharing an identical (gender, age, style set) profile collapse into one bucket, so the
+    search only scans distinct vectors; the nearest buckets are then expanded into up to k
+    opponents. selection picks members within a bucket:
+    - "random": uniform sample (seedable)
+    - "round_robin": rotate through the bucket across queries
+    - "least_recently_matched": members that were handed out longest ago first
+    Buckets at equal distance are visited in order of their first member's row position.
+    """
+
+    SELECTIONS = ("random", "round_robin", "least_recently_matched")
+
+    def __init__(
+        self,
+        user_ids: np.ndarray,
+        X_weighted: np.ndarray,
+        selection: str = "round_robin",
+        seed: Optional[int] = None,
+    ):
+        if selection not in self.SELECTIONS:
+            raise ValueError(f"selection must be one of {self.SELECTIONS}, got {selection!r}")
+        self.selection = selection
+        self.user_ids = user_ids
+        vectors, first_pos, bucket_of, counts = np.unique(
+            X_weighted, axis=0, return_index=True, return_inverse=True, return_counts=True
+        )
+        # Renumber buckets by first member's row position, so top-k ties by bucket number visit
+        # equal-distance buckets in that order
+        order = np.argsort(first_pos)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.shape[0])
+        self.vectors = vectors[order]
+        self._norms = _row_norms(self.vectors)
+        self._bucket_of = rank[bucket_of.ravel()]
+        counts = counts[order]
+        # Members of bucket b are _members[_starts[b]:_starts[b + 1]], in row order
+        self._members = np.argsort(self._bucket_of, kind="stable")
+        self._starts = np.concatenate([[0], np.cumsum(counts)])
+        self._id_index = {uid: pos for pos, uid in enumerate(user_ids)}
+        self._rng = np.random.default_rng(seed)
+        self._cursor = np.zeros(len(counts), dtype=np.intp)
+        self._last_matched = np.zeros(len(user_ids), dtype=np.int64)
+        self._clock = 0
+
+    @classmethod
+    def from_users(
+        cls,
+        users_df: pd.DataFrame,
+        id_column: str = "user_id",
+        selection: str = "round_robin",
+        seed: Optional[int] = None,
+    ) -> "DedupOpponentIndex":
+        """Build the index from a raw user DataFrame (same columns as prepare_features)."""
+        _, X_weighted, _ = prepare_features(users_df)
+        user_ids = users_df[id_column].astype(str).to_numpy(dtype=object)
+        return cls(user_ids, X_weighted, selection=selection, seed=seed)
+
+    def __len__(self) -> int:
+        return self.user_ids.shape[0]
+
+    @property
+    def n_distinct(self) -> int:
+        """Number of distinct feature vectors (buckets) searched per query."""
+        return self.vectors.shape[0]
+
+    def kneighbors(self, user_id: str, k: int) -> Tuple[List[str], np.ndarray]:
+        """Return (opponent_ids, distances) for up to k opponents, excluding the user itself."""
+        pos = self._id_index.get(str(user_id))
+        if pos is None or k <= 0:
+            return [], np.empty(0, dtype=np.float64)
+        own_bucket = self._bucket_of[pos]
+        sq_dist = squared_distances(self.vectors[own_bucket : own_bucket + 1], self.vectors, self._norms)[0]
+        # Every bucket but the user's own holds at least one opponent, so k + 1 buckets always suffice
+        bucket_order = _select_top_k(sq_dist, k + 1)
+
+        picked: List[int] = []
+        picked_dist: List[float] = []
+        for bucket in bucket_order:
+            members = self._members[self._starts[bucket] : self._starts[bucket + 1]]
+            if bucket == own_bucket:
+                members = members[members != pos]
+            chosen = self._pick(bucket, members, k - len(picked))
+            picked.extend(chosen)
+            picked_dist.extend([sq_dist[bucket]] * len(chosen))
+            if len(picked) >= k:
+                break
+
+        if self.selection == "least_recently_matched" and picked:
+            self._clock += 1
+            self._last_matched[picked] = self._clock
+        return [str(uid) for uid in self.user_ids[picked]], np.sqrt(np.array(picked_dist, dtype=np.float64))
+
+    def match(self, user_id: str, k: int) -> List[str]:
+        """Top K opponent user_ids for user_id; same contract as match_opponents."""
+        opponent_ids, _ = self.kneighbors(user_id, k)
+        return opponent_ids
+
+    def _pick(self, bucket: int, members: np.ndarray, n: int) -> List[int]:
+        """Choose up to n row positions from a bucket's (self-excluded) members."""
+        n = min(n, members.shape[0])
+        if n <= 0:
+            return []
+        if n == members.shape[0]:
+            chosen = members
+        elif self.selection == "random":
+            chosen = self._rng.choice(members, size=n, replace=False)
+        elif self.selection == "round_robin":
+            start = self._cursor[bucket] % members.shape[0]
+            chosen = np.roll(members, -start)[:n]
+            self._cursor[bucket] = start + n
+        else:
+            chosen = members[np.argsort(self._last_matched[members], kind="stable")[:n]]
+        return chosen.tolist()
+
+
+# ---------------------------------------------------------------------------
+# Bit-packed backend: 20 style flags in one uint32, exact distances via XOR + popcount
+# ---------------------------------------------------------------------------
+# Squared distance scaled to an integer key, exact while the weights are multiples of 0.5:
+#   (200·d)² = (200·WG)²·Δgender² + (2·WA)²·Δage² + (200·WS)²·popcount(style_a XOR style_b)
+_PACKED_SCALE = 200.0
+_PACKED_COEF_GENDER = int(round((_PACKED_SCALE * WEIGHT_GENDER) ** 2))
+_PACKED_COEF_AGE = int(round((_PACKED_SCALE / 100.0 * WEIGHT_AGE) ** 2))
+_PACKED_COEF_STYLE = int(round((_PACKED_SCALE * WEIGHT_STYLE) ** 2))
+_PACKED_EXCLUDED = np.iinfo(np.int32).max
+
+_POPCOUNT_8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount32(x: np.ndarray) -> np.ndarray:
+    """Per-element popcount of a uint32 array (np.bitwise_count on NumPy 2, byte table otherwise)."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT_8[x[..., None].view(np.uint8)].sum(axis=-1, dtype=np.uint8)
+
+
+class BitPackedMatcher:
+    """
+    Exact KNN opponent matcher over bit-packed features.
+    Each user is a uint32 style mask plus uint8 gender code and uint8 age (6 bytes vs 176 for a
+    float64 feature row). Distances equal the weighted Euclidean distances of prepare_features
+    for integer ages (fractional ages are rounded); ties are ordered by row position.
+    """
+
+    def __init__(self, user_ids: np.ndarray, gender: np.ndarray, age: np.ndarray, style_mask: np.ndarray):
+        self.user_ids = user_ids
+        self.gender = gender
+        self.age = age
+        self.style_mask = style_mask
+        self._id_index = {uid: pos for pos, uid in enumerate(user_ids)}
+
+    @classmethod
+    def from_users(cls, users_df: pd.DataFrame, id_column: str = "user_id") -> "BitPackedMatcher":
+        """Pack a raw user DataFrame (same columns as prepare_features)."""
+        n = len(users_df)
+        gender = _encode_gender(users_df["gender"]).to_numpy(dtype=np.uint8)
+        age = np.rint(users_df["age"].to_numpy(dtype=np.float64).clip(0.0, 100.0)).astype(np.uint8)
+        style_mask = np.zeros(n, dtype=np.uint32)
+        if "preferences" in users_df.columns:
+            rows, cols = _encode_styles(users_df["preferences"])
+            np.bitwise_or.at(style_mask, rows, np.left_shift(np.uint32(1), cols.astype(np.uint32)))
+        user_ids = users_df[id_column].astype(str).to_numpy(dtype=object)
+        return cls(user_ids, gender, age, style_mask)
+
+    def __len__(self) -> int:
+        return self.user_ids.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the packed feature arrays (excluding user_ids)."""
+        return self.gender.nbytes + self.age.nbytes + self.style_mask.nbytes
+
+    def _scaled_sq_distances(self, pos: np.ndarray) -> np.ndarray:
+        """Integer (200·distance)² from users at positions pos to every user, shape (len(pos), n)."""
+        gender = self.gender.astype(np.int32)
+        age = self.age.astype(np.int32)
+        scaled = _popcount32(self.style_mask[pos, None] ^ self.style_mask[None, :]).astype(np.int32)
+        scaled *= _PACKED_COEF_STYLE
+        d_gender = gender[pos, None] - gender[None, :]
+        d_gender *= d_gender
+        d_gender *= _PACKED_COEF_GENDER
+        scaled += d_gender
+        d_age = age[pos, None] - age[None, :]
+        d_age *= d_age
+        d_age *= _PACKED_COEF_AGE
+        scaled += d_age
+        return scaled
+
+    def kneighbors_batch(
+        self,
+        user_ids: Sequence[str],
+        k: int,
+        chunk_size: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract and output as match_opponents_batch, computed on the packed arrays."""
+        n_queries = len(user_ids)
+        opponent_ids = np.full((n_queries, max(k, 0)), None, dtype=object)
+        distances = np.full((n_queries, max(k, 0)), np.inf, dtype=np.float64)
+        n = len(self)
+        if n == 0 or k <= 0 or n_queries == 0:
+            return opponent_ids, distances
+
+        k_eff = min(k, n - 1)
+        query_rows = np.flatnonzero([str(uid) in self._id_index for uid in user_ids])
+        query_pos = np.array([self._id_index[str(user_ids[i])] for i in query_rows], dtype=np.intp)
+        if chunk_size is None:
+            # Three int32 (chunk, n) temporaries are alive at the peak
+            chunk_size = max(1, _BATCH_WORKING_MEMORY // (n * 4 * 3))
+
+        for start in range(0, query_rows.shape[0], chunk_size):
+            rows = query_rows[start : start + chunk_size]
+            pos = query_pos[start : start + chunk_size]
+            scaled = self._scaled_sq_distances(pos)
+            scaled[np.arange(pos.shape[0]), pos] = _PACKED_EXCLUDED
+            for row, row_scaled in zip(rows, scaled):
+                top = _select_top_k(row_scaled, k_eff)
+                opponent_ids[row, : top.shape[0]] = self.user_ids[top]
+                distances[row, : top.shape[0]] = np.sqrt(row_scaled[top]) / _PACKED_SCALE
+
+        return opponent_ids, distances
+
+    def kneighbors(self, user_id: str, k: int) -> Tuple[List[str], np.ndarray]:
+        """Return (opponent_ids, distances) for one user, excluding the user itself."""
+        opponent_ids, distances = self.kneighbors_batch([user_id], k)
+        found = opponent_ids[0] != None  # noqa: E711 - elementwise comparison on object array
+        return [str(uid) for uid in opponent_ids[0][found]], distances[0][found]
+
+    def match(self, user_id: str, k: int) -> List[str]:
+        """Top K opponent user_ids for user_id; same contract as match_opponents."""
+        opponent_ids, _ = self.kneighbors(user_id, k)
+        return opponent_ids
+
+
+# ---------------------------------------------------------------------------
+# Snapshots: versioned single-file format, memory-mapped read-only on load
+# ---------------------------------------------------------------------------
+# Layout: magic | uint32 format version | uint32 header length | JSON header | aligned array blocks
+SNAPSHOT_MAGIC = b"STYLSNAP"
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_PREAMBLE = struct.Struct("<8sII")
+_SNAPSHOT_ALIGN = 64
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is corrupt, of an unknown version or built for another schema."""
+
+
+def snapshot_schema() -> Dict[str, object]:
+    """Feature schema a snapshot is tied to; any change here invalidates existing snapshots."""
+    return {
+        "style_options": list(STYLE_OPTIONS),
+        "gender_map": dict(GENDER_MAP),
+        "weights": {"gender": WEIGHT_GENDER, "age": WEIGHT_AGE, "style": WEIGHT_STYLE},
+        "feature_cols": ["gender_enc", "age_norm"] + [f"style_{s}" for s in STYLE_OPTIONS],
+    }
+
+
+def _schema_hash(schema: Dict[str, object]) -> str:
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _SNAPSHOT_ALIGN) * _SNAPSHOT_ALIGN
+
+
+def save_snapshot(
+    path: str,
+    users_df: pd.DataFrame,
+    X_weighted: np.ndarray,
+    id_column: str = "user_id",
+) -> None:
+    """
+    Write users_df ids and the weighted matrix (from prepare_features) to a snapshot file.
+    The file is written to a temporary name and renamed, so readers never see a partial snapshot.
+    """
+    X = np.ascontiguousarray(X_weighted)
+    ids = users_df[id_column].astype(str).to_numpy(dtype=str)
+    if ids.shape[0] != X.shape[0]:
+        raise ValueError(f"users_df has {ids.shape[0]} rows but X_weighted has {X.shape[0]}")
+    ids = np.ascontiguousarray(ids)
+
+    arrays = {"X_weighted": X, "user_ids": ids}
+    blocks: Dict[str, Dict[str, object]] = {}
+    offset = 0  # relative to the payload, which starts at the first aligned byte after the header
+    checksum = hashlib.sha256()
+    for name, arr in arrays.items():
+        offset = _align(offset)
+        blocks[name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset += arr.nbytes
+        checksum.update(arr.reshape(-1).view(np.uint8))
+    schema = snapshot_schema()
+    header = {
+        "schema": schema,
+        "schema_hash": _schema_hash(schema),
+        "id_column": id_column,
+        "n_users": int(X.shape[0]),
+        "created_at": time.time(),
+        "arrays": blocks,
+        "sha256": checksum.hexdigest(),
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+    payload_start = _align(_SNAPSHOT_PREAMBLE.size + len(header_bytes))
+
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(tmp_fd, "wb") as f:
+            f.write(_SNAPSHOT_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for name, arr in arrays.items():
+                f.write(b"\0" * (payload_start + blocks[name]["offset"] - f.tell()))
+                f.write(arr.reshape(-1).view(np.uint8))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class MatcherSnapshot:
+    """
+    Read-only matcher backed by a memory-mapped snapshot file.
+    The weighted matrix and ids stay in the page cache, shared by every process that loads
+    the same file; nothing is copied into private memory until a query touches it.
+    """
+
+    def __init__(self, path: str, header: Dict[str, object], user_ids: np.ndarray, X_weighted: np.ndarray):
+        self.path = path
+        self.header = header
+        self.user_ids = user_ids
+        self.X_weighted = X_weighted
+        self._id_index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.X_weighted.shape[0]
+
+    @property
+    def id_index(self) -> Dict[str, int]:
+        """user_id -> row position, built on first use so loading itself stays O(1)."""
+        if self._id_index is None:
+            self._id_index = {str(uid): pos for pos, uid in enumerate(self.user_ids)}
+        return self._id_index
+
+    def kneighbors_batch(
+        self,
+        user_ids: Sequence[str],
+        k: int,
+        chunk_size: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract and output as match_opponents_batch."""
+        return _kneighbors_batch_dense(user_ids, k, self.user_ids, self.X_weighted, self.id_index, chunk_size)
+
+    def match(self, user_id: str, k: int) -> List[str]:
+        """Top K opponent user_ids for user_id; same contract as match_opponents."""
+        opponent_ids, _ = self.kneighbors_batch([user_id], k)
+        return [uid for uid in opponent_ids[0] if uid is not None]
+
+
+def load_snapshot(path: str, verify: bool = True) -> MatcherSnapshot:
+    """
+    Open a snapshot written by save_snapshot, memory-mapped read-only.
+    - Rejects files with a different format version or a schema that no longer matches
+      STYLE_OPTIONS / GENDER_MAP / the weights.
+    - verify=True also checks the payload checksum, which reads the whole file once; a worker
+      pool can verify in the parent and load with verify=False in each worker.
+    """
+    with open(path, "rb") as f:
+        preamble = f.read(_SNAPSHOT_PREAMBLE.size)
+        if len(preamble) != _SNAPSHOT_PREAMBLE.size:
+            raise SnapshotError(f"{path}: truncated snapshot")
+        magic, version, header_len = _SNAPSHOT_PREAMBLE.unpack(preamble)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{path}: not a matcher snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(f"{path}: snapshot format version {version}, expected {SNAPSHOT_VERSION}")
+        header_bytes = f.read(header_len)
+        if len(header_bytes) != header_len:
+            raise SnapshotError(f"{path}: truncated snapshot")
+        try:
+            header = json.loads(header_bytes.decode("utf-8"))
+        except ValueError as e:
+            raise SnapshotError(f"{path}: unreadable snapshot header ({e})") from e
+
+    if header.get("schema_hash") != _schema_hash(snapshot_schema()):
+        raise SnapshotError(f"{path}: snapshot was built for a different feature schema")
+
+    file_size = os.path.getsize(path)
+    arrays = {}
+    for name, block in header["arrays"].items():
+        dtype = np.dtype(block["dtype"])
+        shape = tuple(block["shape"])
+        offset = _align(_SNAPSHOT_PREAMBLE.size + header_len) + block["offset"]
+        if offset + dtype.itemsize * int(np.prod(shape)) > file_size:
+            raise SnapshotError(f"{path}: truncated snapshot")
+        if 0 in shape:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, mode="r", dtype=dtype, offset=offset, shape=shape)
+
+    if verify:
+        checksum = hashlib.sha256()
+        for name in header["arrays"]:
+            checksum.update(np.asarray(arrays[name]).reshape(-1).view(np.uint8))
+        if checksum.hexdigest() != header.get("sha256"):
+            raise SnapshotError(f"{path}: checksum mismatch")
+
+    return MatcherSnapshot(path, header, arrays["user_ids"], arrays["X_weighted"])
+
+
 # ---------------------------------------------------------------------------
 # Mock dataset and sample usage
 # ---------------------------------------------------------------------------
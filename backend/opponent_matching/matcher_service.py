@@ -0,0 +1,260 @@
+"""
+Long-running opponent matching service.
+Loads users in bulk from a JSONL/CSV export, keeps an OpponentIndex hot in memory and serves
+single/batch match requests plus incremental user-change events, so the Node backend can
+delegate matching instead of scanning every user per request.
+
+Run: cd backend/opponent_matching && MATCHER_USERS_FILE=users.jsonl python matcher_service.py
+"""
+
+import json
+import os
+import threading
+from typing import List, Optional
+
+import pandas as pd
+from flask import Flask, jsonify, request
+
+from knn_matcher import OpponentIndex
+
+app = Flask(__name__)
+
+# Port 5002 so it doesn't conflict with Node backend (5000) or the scraper (5001)
+MATCHER_PORT = int(os.environ.get("MATCHER_PORT", 5002))
+MATCHER_USERS_FILE = os.environ.get("MATCHER_USERS_FILE", "")
+MAX_K = 50
+MAX_BATCH = 10000
+# /match/batch scores this many ids per lock hold, so user events aren't stalled behind a whole batch
+BATCH_LOCK_CHUNK = 256
+
+_index = OpponentIndex()
+# Flask serves requests on threads; index reads and writes go through this lock
+_index_lock = threading.Lock()
+
+
+def _normalize_id(value) -> str:
+    """Accept plain ids and Mongo extended-JSON ObjectIds ({"$oid": "..."})."""
+    if isinstance(value, dict) and "$oid" in value:
+        return str(value["$oid"])
+    return str(value)
+
+
+def _normalize_preferences(value) -> List[str]:
+    """Preferences may be a list (JSONL) or a JSON / "|"-separated string (CSV)."""
+    if isinstance(value, list):
+        return [str(p) for p in value]
+    if not isinstance(value, str) or not value.strip():
+        return []
+    value = value.strip()
+    if value.startswith("["):
+        try:
+            return [str(p) for p in json.loads(value)]
+        except ValueError:
+            pass
+    return [p for p in value.split("|") if p]
+
+
+def load_users(path: str) -> pd.DataFrame:
+    """
+    Bulk-load a user export (local stand-in for User.find()) into the prepare_features layout.
+    Supports .jsonl/.json (one user per line) and .csv; ids may be "user_id" or Mongo "_id".
+    """
+    if path.endswith(".csv"):
+        users_df = pd.read_csv(path, dtype={"user_id": str, "_id": str})
+    else:
+        users_df = pd.read_json(path, lines=True, dtype={"user_id": str})
+    if "user_id" not in users_df.columns:
+        users_df["user_id"] = users_df["_id"]
+    users_df["user_id"] = users_df["user_id"].map(_normalize_id)
+    if "gender" not in users_df.columns:
+        users_df["gender"] = ""
+    users_df["gender"] = users_df["gender"].fillna("").astype(str)
+    if "preferences" not in users_df.columns:
+        users_df["preferences"] = [[] for _ in range(len(users_df))]
+    users_df["preferences"] = users_df["preferences"].map(_normalize_preferences)
+    users_df = users_df.drop_duplicates("user_id", keep="last").reset_index(drop=True)
+    return users_df[["user_id", "gender", "age", "preferences"]]
+
+
+def load_index(path: str) -> OpponentIndex:
+    """Build a fresh index from a user export and swap it in atomically."""
+    global _index
+    index = OpponentIndex.from_users(load_users(path))
+    with _index_lock:
+        _index = index
+    print(f"[Matcher] Loaded {len(index)} users from {path}")
+    return index
+
+
+def _match_filters(data: dict) -> dict:
+    """Optional OpponentIndex.kneighbors filters from a request body."""
+    filters = {}
+    if data.get("exclude_ids"):
+        filters["exclude_ids"] = [str(uid) for uid in data["exclude_ids"]]
+    if data.get("allowed_ids") is not None:
+        filters["allowed_ids"] = [str(uid) for uid in data["allowed_ids"]]
+    if data.get("same_gender"):
+        filters["same_gender"] = True
+    if data.get("age_range"):
+        low, high = data["age_range"]
+        filters["age_range"] = (float(low), float(high))
+    return filters
+
+
+def _parse_k(data: dict) -> int:
+    return max(1, min(int(data.get("k", 1)), MAX_K))
+
+
+def _parse_age(value) -> Optional[float]:
+    """Age from an event as a float, or None if it is missing or not a number."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Flask routes
+@app.route("/match", methods=["POST"])
+def match():
+    try:
+        data = request.json or {}
+        user_id = data.get("user_id")
+        if not user_id:
+            return jsonify({"error": "user_id is required"}), 400
+        k = _parse_k(data)
+        filters = _match_filters(data)
+        with _index_lock:
+            if user_id not in _index:
+                return jsonify({"error": "Unknown user_id", "opponents": []}), 404
+            opponent_ids, distances = _index.kneighbors(str(user_id), k, **filters)
+        return jsonify({
+            "success": True,
+            "opponents": opponent_ids,
+            "distances": [float(d) for d in distances],
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"[Matcher] Error processing match request: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/match/batch", methods=["POST"])
+def match_batch():
+    try:
+        data = request.json or {}
+        user_ids = data.get("user_ids") or []
+        if not isinstance(user_ids, list) or not user_ids:
+            return jsonify({"error": "user_ids must be a non-empty list"}), 400
+        if len(user_ids) > MAX_BATCH:
+            return jsonify({"error": f"At most {MAX_BATCH} user_ids per batch"}), 400
+        k = _parse_k(data)
+        filters = _match_filters(data)
+        user_ids = [str(uid) for uid in user_ids]
+        results = {}
+        for start in range(0, len(user_ids), BATCH_LOCK_CHUNK):
+            chunk = user_ids[start : start + BATCH_LOCK_CHUNK]
+            with _index_lock:
+                opponent_ids, distances = _index.kneighbors_batch(chunk, k, **filters)
+            for user_id, ids_row, dist_row in zip(chunk, opponent_ids, distances):
+                found = ids_row != None  # noqa: E711 - elementwise comparison on object array
+                results[user_id] = {
+                    "opponents": [str(uid) for uid in ids_row[found]],
+                    "distances": [float(d) for d in dist_row[found]],
+                }
+        return jsonify({"success": True, "results": results})
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"[Matcher] Error processing batch match request: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/users/events", methods=["POST"])
+def user_events():
+    """
+    Apply user-change events in order:
+    {"events": [{"type": "upsert", "user": {"user_id", "gender", "age", "preferences"}},
+                {"type": "remove", "user_id": "..."}]}
+    """
+    try:
+        data = request.json or {}
+        events = data.get("events") or []
+        if not isinstance(events, list):
+            return jsonify({"error": "events must be a list"}), 400
+        applied = 0
+        errors = []
+        with _index_lock:
+            for i, event in enumerate(events):
+                # Each event is validated before it touches the index, so a bad one is reported in
+                # errors instead of failing the request after earlier events were applied
+                if not isinstance(event, dict):
+                    errors.append({"index": i, "error": "event must be an object"})
+                    continue
+                kind = event.get("type")
+                if kind == "upsert":
+                    user = event.get("user") or {}
+                    user_id = user.get("user_id", user.get("_id")) if isinstance(user, dict) else None
+                    age = _parse_age(user.get("age")) if user_id is not None else None
+                    if user_id is None or age is None:
+                        errors.append({"index": i, "error": "upsert needs user.user_id and a numeric user.age"})
+                        continue
+                    _index.upsert(
+                        _normalize_id(user_id),
+                        user.get("gender") or "",
+                        age,
+                        _normalize_preferences(user.get("preferences")),
+                    )
+                elif kind == "remove":
+                    _index.remove(_normalize_id(event.get("user_id")))
+                else:
+                    errors.append({"index": i, "error": f"Unknown event type: {kind!r}"})
+                    continue
+                applied += 1
+            n_users = len(_index)
+        return jsonify({"success": not errors, "applied": applied, "errors": errors, "users": n_users})
+    except Exception as e:
+        print(f"[Matcher] Error applying user events: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/reload", methods=["POST"])
+def reload_users():
+    try:
+        if not MATCHER_USERS_FILE:
+            return jsonify({"error": "No users file configured"}), 400
+        index = load_index(MATCHER_USERS_FILE)
+        return jsonify({"success": True, "users": len(index)})
+    except Exception as e:
+        print(f"[Matcher] Error reloading users: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    with _index_lock:
+        n_users = len(_index)
+    return jsonify({"status": "healthy", "users": n_users})
+
+
+@app.route("/", methods=["GET"])
+def home():
+    return jsonify({
+        "message": "Opponent Matching API",
+        "endpoints": {
+            "/match": "POST - Top K opponents for one user",
+            "/match/batch": "POST - Top K opponents for many users",
+            "/users/events": "POST - Apply user upsert/remove events",
+            "/reload": "POST - Reload users from the export file",
+            "/health": "GET - Health check",
+        },
+    })
+
+
+if __name__ == "__main__":
+    if MATCHER_USERS_FILE:
+        load_index(MATCHER_USERS_FILE)
+    # threaded=True: requests share the one in-memory index
+    app.run(port=MATCHER_PORT, host="0.0.0.0", threaded=True)
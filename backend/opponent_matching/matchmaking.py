@@ -0,0 +1,259 @@
+"""
+Global matchmaking for the outfit battle queue.
+Pairs a whole pool of waiting users into disjoint battles in one pass, on top of knn_matcher:
+batched neighbor searches within style groups, then greedy pairing on the candidate edges.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from knn_matcher import build_id_index, kneighbors_positions, squared_distances
+
+# Candidate opponents fetched per waiting user; the greedy pass only looks at these edges
+DEFAULT_CANDIDATES = 10
+
+
+class PairingResult:
+    """
+    Outcome of pair_waiting_pool.
+    - pairs / pair_distances: disjoint (user_a, user_b) battles and their weighted distances
+    - unmatched: pool users left without an opponent (odd pool size, unknown ids)
+    - regret: per known pooled user (first-seen pool order), pair distance minus the distance to their
+      individual best match in the pool; NaN for unmatched users
+    """
+
+    def __init__(
+        self,
+        pairs: List[Tuple[str, str]],
+        pair_distances: np.ndarray,
+        unmatched: List[str],
+        regret: np.ndarray,
+        rounds: int,
+    ):
+        self.pairs = pairs
+        self.pair_distances = pair_distances
+        self.unmatched = unmatched
+        self.regret = regret
+        self.rounds = rounds
+
+    def summary(self) -> Dict[str, float]:
+        """Aggregate pairing quality: how much worse than everyone's individual best match."""
+        matched = self.regret[~np.isnan(self.regret)]
+        return {
+            "n_pairs": len(self.pairs),
+            "n_unmatched": len(self.unmatched),
+            "total_distance": float(self.pair_distances.sum()),
+            "mean_regret": float(matched.mean()) if matched.size else 0.0,
+            "max_regret": float(matched.max()) if matched.size else 0.0,
+            "share_best_match": float((matched <= 1e-9).mean()) if matched.size else 0.0,
+            "rounds": self.rounds,
+        }
+
+
+def _greedy_pairs(
+    neighbor_pos: np.ndarray,
+    neighbor_dist: np.ndarray,
+    matched: np.ndarray,
+) -> List[Tuple[int, int, float]]:
+    """
+    Greedy min-distance pairing over candidate edges (i -> neighbor_pos[i, j]).
+    Edges are taken shortest first, so every mutual nearest-neighbor pair is taken before any
+    conflicting edge; the result is a 2-approximation of the min-cost matching on these edges.
+    Marks paired positions in matched.
+    """
+    rows = np.repeat(np.arange(neighbor_pos.shape[0]), neighbor_pos.shape[1])
+    cols = neighbor_pos.ravel()
+    dist = neighbor_dist.ravel()
+    valid = cols >= 0
+    rows, cols, dist = rows[valid], cols[valid], dist[valid]
+    # Order by distance, then by the smaller endpoint so the pairing is deterministic
+    order = np.lexsort((np.maximum(rows, cols), np.minimum(rows, cols), dist))
+
+    pairs = []
+    for a, b, d in zip(rows[order].tolist(), cols[order].tolist(), dist[order].tolist()):
+        if matched[a] or matched[b]:
+            continue
+        matched[a] = matched[b] = True
+        pairs.append((a, b, d))
+    return pairs
+
+
+def _pair_in_rounds(
+    X_pool: np.ndarray,
+    members: np.ndarray,
+    n_candidates: int,
+    chunk_size: Optional[int],
+    on_pair,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Pair the pool rows in members: each round runs one batched n_candidates-NN search among the
+    still-unmatched rows and pairs them greedily; rows whose candidates were all claimed go to the
+    next round. Calls on_pair(row_a, row_b, distance) per pair.
+    Returns (unpaired rows, first-round nearest-neighbor distance per member, rounds).
+    """
+    remaining = members
+    best = np.full(members.shape[0], np.inf)
+    rounds = 0
+    while remaining.shape[0] >= 2:
+        rounds += 1
+        neighbor_pos, neighbor_dist = kneighbors_positions(
+            X_pool[remaining], np.arange(remaining.shape[0]), n_candidates, chunk_size
+        )
+        if rounds == 1:
+            best = neighbor_dist[:, 0].copy()
+        paired = np.zeros(remaining.shape[0], dtype=bool)
+        for a, b, d in _greedy_pairs(neighbor_pos, neighbor_dist, paired):
+            on_pair(remaining[a], remaining[b], d)
+        remaining = remaining[~paired]
+    return remaining, best, rounds
+
+
+def _pair_by_age(
+    X_pool: np.ndarray,
+    members: np.ndarray,
+    on_pair,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pair the rows of one style group without a neighbor search. Inside a group distances only
+    depend on gender and age, and any same-gender opponent is at least as close as any other-gender
+    one, so each gender's rows are sorted by age and paired with an age neighbor: the min-cost
+    pairing on a line. With an odd count the row whose exclusion is cheapest is left out.
+    Calls on_pair(row_a, row_b, distance) per pair.
+    Returns (unpaired rows, nearest same-gender distance per member, inf for a gender's only row).
+    """
+    gender, age = X_pool[members, 0], X_pool[members, 1]
+    order = np.lexsort((members, age, gender))
+    bounds = np.flatnonzero(np.diff(gender[order])) + 1
+    best = np.full(members.shape[0], np.inf)
+    unpaired = []
+    for seg in np.split(order, bounds):
+        gaps = np.abs(np.diff(age[seg]))
+        if gaps.shape[0]:
+            best[seg] = np.minimum(np.append(gaps, np.inf), np.insert(gaps, 0, np.inf))
+        skip = seg.shape[0]
+        if seg.shape[0] % 2:
+            # Leaving out position 2t pairs (0,1)..(2t-2,2t-1) by the even gaps and the rest by the odd ones
+            even = np.concatenate([[0.0], np.cumsum(gaps[0::2])])
+            odd = np.concatenate([[0.0], np.cumsum(gaps[1::2])])
+            skip = 2 * int(np.argmin(even + odd[-1] - odd))
+            unpaired.append(seg[skip])
+        for i in [*range(0, skip - 1, 2), *range(skip + 1, seg.shape[0] - 1, 2)]:
+            on_pair(members[seg[i]], members[seg[i + 1]], float(gaps[i]))
+    return np.array(sorted(members[unpaired]), dtype=np.intp), best
+
+
+def _nearest_across_groups(
+    X_pool: np.ndarray,
+    styles: np.ndarray,
+    groups: List[np.ndarray],
+    group_of: np.ndarray,
+    rows: np.ndarray,
+) -> np.ndarray:
+    """
+    Nearest-opponent distance in the pool for rows that are alone in their style group.
+    Only the groups whose style set is within the largest gender + age gap in the pool of the
+    nearest other style set are searched; no further group can hold a closer opponent.
+    """
+    style_norms = np.einsum("ij,ij->i", styles, styles)
+    span = X_pool[:, :2].max(axis=0) - X_pool[:, :2].min(axis=0)
+    margin = float(span @ span)
+    best = np.full(rows.shape[0], np.inf)
+    for i, row in enumerate(rows):
+        own = group_of[row]
+        style_sq = style_norms + style_norms[own] - 2.0 * (styles @ styles[own])
+        style_sq[own] = np.inf
+        nearest = style_sq.min()
+        if nearest == np.inf:
+            continue
+        candidates = np.concatenate([groups[g] for g in np.flatnonzero(style_sq <= nearest + margin)])
+        best[i] = np.sqrt(squared_distances(X_pool[row : row + 1], X_pool[candidates])[0].min())
+    return best
+
+
+def pair_waiting_pool(
+    pool_ids: Sequence[str],
+    users_df: pd.DataFrame,
+    X_weighted: np.ndarray,
+    id_index: Optional[Dict[str, int]] = None,
+    id_column: str = "user_id",
+    n_candidates: int = DEFAULT_CANDIDATES,
+    chunk_size: Optional[int] = None,
+) -> PairingResult:
+    """
+    Pair every waiting user with one opponent so that no user appears in two battles.
+    - users_df / X_weighted come from prepare_features; pool_ids is the waiting subset.
+    - Users are first paired inside groups sharing the exact same style set. With the default
+      weights a single differing style (WEIGHT_STYLE² = 4) outweighs any gender + age gap
+      (at most 1.25), so these are the edges a global pass would take first. Within a group
+      users are paired by age per gender (see _pair_by_age), in O(n log n).
+    - The at most one odd user per gender in a group is paired within the group, and whoever is
+      still left over is then paired across groups.
+    """
+    if id_index is None:
+        id_index = build_id_index(users_df, id_column)
+    seen = set()
+    known: List[str] = []
+    unknown: List[str] = []
+    for uid in map(str, pool_ids):
+        if uid in seen:
+            continue
+        seen.add(uid)
+        (known if uid in id_index else unknown).append(uid)
+
+    n = len(known)
+    X_pool = X_weighted[np.array([id_index[uid] for uid in known], dtype=np.intp)] if n else X_weighted[:0]
+    regret = np.full(n, np.nan)
+    best = np.full(n, np.inf)
+    pair_rows: List[Tuple[int, int]] = []
+    pair_distances: List[float] = []
+
+    def on_pair(a: int, b: int, d: float) -> None:
+        pair_rows.append((a, b))
+        pair_distances.append(d)
+
+    rounds = 0
+    leftovers = [np.empty(0, dtype=np.intp)]
+    singles = [np.empty(0, dtype=np.intp)]
+    if n:
+        # One integer per style set (bit j = style j chosen), which np.unique sorts far faster than rows
+        style_key = (X_pool[:, 2:] != 0) @ (np.int64(1) << np.arange(X_pool.shape[1] - 2, dtype=np.int64))
+        _, first, group_of = np.unique(style_key, return_index=True, return_inverse=True)
+        styles = X_pool[first, 2:]
+        order = np.argsort(group_of, kind="stable")
+        groups = np.split(order, np.flatnonzero(np.diff(group_of[order])) + 1)
+        for members in groups:
+            if members.shape[0] < 2:
+                singles.append(members)
+                continue
+            odd, group_best = _pair_by_age(X_pool, members, on_pair)
+            best[members] = group_best
+            group_rounds = 1
+            if odd.shape[0]:
+                # A gender's only row has its nearest opponent in another gender of the group
+                # (members come out of the stable sort in row order, so searchsorted finds them)
+                _, odd_best = kneighbors_positions(X_pool[members], np.searchsorted(members, odd), 1, chunk_size)
+                best[odd] = odd_best[:, 0]
+                odd, _, odd_rounds = _pair_in_rounds(X_pool, odd, n_candidates, chunk_size, on_pair)
+                group_rounds += odd_rounds
+            rounds = max(rounds, group_rounds)
+            leftovers.append(odd)
+
+    single = np.concatenate(singles)
+    if single.shape[0]:
+        # Everyone else's best match is in their own group; these users' is in a nearby one
+        best[single] = _nearest_across_groups(X_pool, styles, groups, group_of, single)
+    leftover = np.sort(np.concatenate(leftovers + [single]))
+    unpaired, _, cross_rounds = _pair_in_rounds(X_pool, leftover, n_candidates, chunk_size, on_pair)
+    rounds += cross_rounds
+
+    for (a, b), d in zip(pair_rows, pair_distances):
+        regret[a] = d - best[a]
+        regret[b] = d - best[b]
+    return PairingResult(
+        [(known[a], known[b]) for a, b in pair_rows],
+        np.array(pair_distances, dtype=np.float64),
+        [known[i] for i in unpaired] + unknown,
+        regret,
+        rounds,
+    )
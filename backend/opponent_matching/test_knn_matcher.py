@@ -0,0 +1,273 @@
+"""
+Equivalence tests: the vectorized prepare_features against the original row-by-row implementation,
+and the matchers, snapshots and matchmaking against a brute-force scan.
+Run: cd backend/opponent_matching && python -m pytest -q
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import knn_matcher
+from knn_matcher import (
+    GENDER_MAP,
+    STYLE_OPTIONS,
+    OpponentIndex,
+    SnapshotError,
+    WEIGHT_AGE,
+    WEIGHT_GENDER,
+    WEIGHT_STYLE,
+    build_id_index,
+    build_knn_model,
+    encode_user,
+    load_snapshot,
+    match_opponents,
+    match_opponents_batch,
+    prepare_features,
+    save_snapshot,
+)
+from matchmaking import pair_waiting_pool
+
+
+def baseline_prepare_features(users_df: pd.DataFrame):
+    """The original iterrows implementation of prepare_features, kept as the reference."""
+    gender_encoded = users_df["gender"].str.lower().map(GENDER_MAP)
+    if gender_encoded.isna().any():
+        gender_encoded = gender_encoded.fillna(GENDER_MAP["other"])
+    users_df = users_df.copy()
+    users_df["gender_enc"] = gender_encoded.astype(int)
+    users_df["age_norm"] = (users_df["age"] / 100.0).clip(0.0, 1.0)
+
+    style_columns = [f"style_{s}" for s in STYLE_OPTIONS]
+    for col in style_columns:
+        users_df[col] = 0
+    for idx, row in users_df.iterrows():
+        prefs = row.get("preferences") or []
+        for p in prefs:
+            pnorm = str(p).strip()
+            for style_name in STYLE_OPTIONS:
+                if style_name.lower() == pnorm.lower():
+                    users_df.at[idx, f"style_{style_name}"] = 1
+                    break
+
+    feature_cols = ["gender_enc", "age_norm"] + style_columns
+    X = users_df[feature_cols].values.astype(np.float64)
+    weights = np.array(
+        [WEIGHT_GENDER, WEIGHT_AGE] + [WEIGHT_STYLE] * len(style_columns),
+        dtype=np.float64,
+    )
+    return users_df, X * weights, feature_cols
+
+
+def _random_users(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    genders = np.array(["male", "Female", "OTHER", "unknown", "female"], dtype=object)
+    styles = STYLE_OPTIONS + [" streetwear ", "VINTAGE", "Not A Style", ""]
+    return pd.DataFrame({
+        "user_id": [f"u{i}" for i in range(n)],
+        "gender": genders[rng.integers(0, len(genders), n)],
+        "age": rng.integers(-5, 120, n).astype(float),
+        "preferences": [
+            [styles[j] for j in rng.integers(0, len(styles), rng.integers(0, 6))]
+            for _ in range(n)
+        ],
+    }, index=rng.permutation(n) + 1000)
+
+
+EDGE_CASES = pd.DataFrame({
+    "user_id": ["list", "tuple", "empty", "none", "duplicate", "string", "mixed_case", "non_str"],
+    "gender": ["male", "female", "other", "Male", "FEMALE", "female", "other", "male"],
+    "age": [25.0, 31.0, 0.0, 100.0, 47.5, 22.0, 64.0, 18.0],
+    "preferences": [
+        ["Streetwear", "Vintage"],
+        ("Minimalist",),
+        [],
+        None,
+        ["Sporty", "sporty", " SPORTY "],
+        "Streetwear",
+        ["high fashion", "Y2k"],
+        [1, None, "Edgy"],
+    ],
+})
+
+
+@pytest.mark.parametrize("users_df", [_random_users(500), EDGE_CASES], ids=["random", "edge_cases"])
+def test_prepare_features_matches_baseline(users_df):
+    expected_df, expected_X, expected_cols = baseline_prepare_features(users_df)
+    feature_df, X_weighted, feature_cols = prepare_features(users_df)
+
+    assert feature_cols == expected_cols
+    np.testing.assert_array_equal(X_weighted, expected_X)
+    pd.testing.assert_frame_equal(
+        feature_df[feature_cols], expected_df[expected_cols], check_dtype=False
+    )
+
+
+def test_scalar_string_preferences_set_no_style():
+    _, X_weighted, _ = prepare_features(EDGE_CASES)
+    row = EDGE_CASES.index[EDGE_CASES["user_id"] == "string"][0]
+    assert X_weighted[row, 2:].sum() == 0.0
+
+
+def test_sparse_and_encode_user_match_dense():
+    users_df = _random_users(200, seed=1)
+    _, X_dense, _ = prepare_features(users_df)
+    _, X_sparse, _ = prepare_features(users_df, sparse=True)
+    np.testing.assert_array_equal(X_sparse.toarray(), X_dense)
+
+    for pos, user in enumerate(users_df.itertuples(index=False)):
+        np.testing.assert_array_equal(
+            encode_user(user.gender, user.age, user.preferences), X_dense[pos]
+        )
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"same_gender": True},
+        {"age_range": (20.0, 60.0)},
+        {"exclude_ids": ["u1", "u2"], "allowed_ids": [f"u{i}" for i in range(0, 200, 3)]},
+    ],
+    ids=["same_gender", "age_range", "ids"],
+)
+def test_filtered_match_on_sparse_matches_dense(filters):
+    users_df = _random_users(200, seed=2)
+    feature_df, X_dense, _ = prepare_features(users_df)
+    _, X_sparse, _ = prepare_features(users_df, sparse=True)
+    dense_model, sparse_model = build_knn_model(X_dense), build_knn_model(X_sparse)
+
+    for user_id in ["u0", "u7", "u150"]:
+        expected = match_opponents(user_id, 5, feature_df, X_dense, dense_model, **filters)
+        assert match_opponents(user_id, 5, feature_df, X_sparse, sparse_model, **filters) == expected
+
+
+def _brute_force(X: np.ndarray, pos: int) -> np.ndarray:
+    """Distances from row pos to every row by direct differencing: the reference for the matchers."""
+    return np.sqrt(((X - X[pos]) ** 2).sum(axis=1))
+
+
+def _assert_top_k(ids, distances, X, id_to_pos, user_id, k, allowed=None):
+    """ids / distances are the k nearest allowed rows to user_id (ties may come in either order)."""
+    reference = _brute_force(X, id_to_pos[user_id])
+    if allowed is not None:
+        reference[~allowed] = np.inf
+    reference[id_to_pos[user_id]] = np.inf
+    expected = np.sort(reference)[:k]
+    expected = expected[np.isfinite(expected)]
+    assert len(ids) == len(expected)
+    np.testing.assert_allclose(np.asarray(distances)[: len(ids)], expected)
+    np.testing.assert_allclose(reference[[id_to_pos[uid] for uid in ids]], expected)
+
+
+def test_match_opponents_batch_matches_brute_force():
+    users_df = _random_users(300, seed=3)
+    _, X, _ = prepare_features(users_df)
+    id_index = build_id_index(users_df)
+    queries = ["u0", "missing", "u42", "u0", "u299"]
+
+    opponent_ids, distances = match_opponents_batch(queries, 6, users_df, X, id_index=id_index, chunk_size=2)
+
+    assert opponent_ids.shape == distances.shape == (5, 6)
+    assert (opponent_ids[1] == None).all() and np.isinf(distances[1]).all()  # noqa: E711
+    for row, user_id in enumerate(queries):
+        if user_id != "missing":
+            _assert_top_k(list(opponent_ids[row]), distances[row], X, id_index, user_id, 6)
+
+
+def test_opponent_index_tracks_upserts_and_removals():
+    users_df = _random_users(300, seed=4).reset_index(drop=True)
+    index = OpponentIndex.from_users(users_df)
+    users = {row["user_id"]: row for row in users_df.to_dict("records")}
+
+    def check(user_ids, **filters):
+        live = pd.DataFrame(list(users.values()))
+        _, X, _ = prepare_features(live)
+        id_to_pos = build_id_index(live)
+        allowed = np.ones(len(live), dtype=bool)
+        for user_id in user_ids:
+            if filters.get("same_gender"):
+                allowed = X[:, 0] == X[id_to_pos[user_id], 0]
+            opponent_ids, distances = index.kneighbors(user_id, 5, **filters)
+            _assert_top_k(opponent_ids, distances, X, id_to_pos, user_id, 5, allowed)
+
+    # Updates in place, inserts, and tombstones below the compaction threshold
+    for i in range(0, 300, 10):
+        index.upsert(f"u{i}", "female", 30 + i % 7, ["Vintage", "Edgy"])
+        users[f"u{i}"] = dict(user_id=f"u{i}", gender="female", age=30.0 + i % 7, preferences=["Vintage", "Edgy"])
+    index.upsert("new", "male", 41, ["Formal"])
+    users["new"] = dict(user_id="new", gender="male", age=41.0, preferences=["Formal"])
+    for i in range(1, 200, 2):
+        assert index.remove(f"u{i}")
+        del users[f"u{i}"]
+    assert not index.remove("u1") and "u1" not in index
+    assert len(index) == len(users) and index._n_dead == 100
+    check(["u0", "u10", "new", "u298"])
+    check(["u0", "new"], same_gender=True)
+
+    # The 151st tombstone of 301 rows tips past half, and the matrix is compacted
+    for i in range(200, 251):
+        index.remove(f"u{i}")
+        del users[f"u{i}"]
+    assert index._n_dead == 0 and index.user_ids == list(users)
+    check(["u0", "u10", "new", "u298"])
+
+
+def test_snapshot_round_trip_and_rejections(tmp_path, monkeypatch):
+    users_df = _random_users(200, seed=5)
+    _, X, _ = prepare_features(users_df)
+    path = str(tmp_path / "users.snap")
+    save_snapshot(path, users_df, X)
+
+    snapshot = load_snapshot(path)
+    queries = ["u3", "u77", "missing"]
+    expected_ids, expected_distances = match_opponents_batch(queries, 4, users_df, X)
+    opponent_ids, distances = snapshot.kneighbors_batch(queries, 4)
+    assert (opponent_ids == expected_ids).all()
+    np.testing.assert_array_equal(distances, expected_distances)
+    del snapshot
+
+    # A flipped payload byte fails the checksum, and only the checksum
+    with open(path, "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(SnapshotError, match="checksum"):
+        load_snapshot(path)
+    load_snapshot(path, verify=False)
+
+    # A snapshot built under other weights is refused before any data is read
+    monkeypatch.setattr(knn_matcher, "WEIGHT_STYLE", WEIGHT_STYLE * 2)
+    with pytest.raises(SnapshotError, match="schema"):
+        load_snapshot(path, verify=False)
+
+
+def test_pair_waiting_pool_pairs_disjoint_users_with_consistent_regret():
+    users_df = _random_users(400, seed=6)
+    _, X, _ = prepare_features(users_df)
+    id_index = build_id_index(users_df)
+    pool = [f"u{i}" for i in range(0, 400, 3)] + ["ghost", "u0"]
+    known = list(dict.fromkeys(uid for uid in pool if uid in id_index))
+
+    result = pair_waiting_pool(pool, users_df, X, id_index=id_index, n_candidates=4)
+
+    paired = [uid for pair in result.pairs for uid in pair]
+    assert len(paired) == len(set(paired))
+    assert sorted(paired + result.unmatched) == sorted(known + ["ghost"])
+    assert "ghost" in result.unmatched and len(result.unmatched) == 1 + len(known) % 2
+
+    pool_pos = np.array([id_index[uid] for uid in known])
+    X_pool = X[pool_pos]
+    row_of = {uid: row for row, uid in enumerate(known)}
+    pair_of = {a: (b, d) for (a, b), d in zip(result.pairs, result.pair_distances)}
+    pair_of.update({b: (a, d) for (a, b), d in zip(result.pairs, result.pair_distances)})
+    for uid, row in row_of.items():
+        reference = _brute_force(X_pool, row)
+        if uid not in pair_of:
+            assert np.isnan(result.regret[row])
+            continue
+        opponent, distance = pair_of[uid]
+        assert distance == pytest.approx(reference[row_of[opponent]])
+        reference[row] = np.inf
+        assert result.regret[row] == pytest.approx(distance - reference.min(), abs=1e-9)
+        assert result.regret[row] >= -1e-9
@@ -2,6 +2,7 @@ const express = require('express');
 const jwt = require('jsonwebtoken');
 const mongoose = require('mongoose');
 const User = require('../models/User');
+const { publishUserChange } = require('../services/opponentMatching');
 const multer = require('multer');
 const path = require('path');
 
@@ -87,6 +88,7 @@ router.post('/signup', upload.single('avatar'), requireDb, async (req, res, next
     });
     
     await user.save();
+    publishUserChange(user);
     
     // Generate token
     const token = jwt.sign(
@@ -6,7 +6,7 @@ const Vote = require('../models/Vote');
 const User = require('../models/User');
 const ClosetItem = require('../models/ClosetItem');
 const jwt = require('jsonwebtoken');
-const { matchOpponents } = require('../services/opponentMatching');
+const { matchOpponents, matchOpponentsViaService } = require('../services/opponentMatching');
 
 const router = express.Router();
 
@@ -89,12 +89,16 @@ router.post('/', auth, requireDb, async (req, res) => {
       status: 'waiting',
     });
 
-    // Automatic opponent matching: fetch all users, pick nearest by gender/age/style (weighted KNN)
+    // Automatic opponent matching: nearest by gender/age/style (weighted KNN).
+    // Prefer the matcher service's in-memory index; fall back to scanning all users.
     const currentIdStr = String(req.userId);
-    const allUsers = await User.find()
-      .select('_id name gender age preferences avatar')
-      .lean();
-    const opponentIds = matchOpponents(currentIdStr, allUsers, 5); // try up to 5 candidates
+    let opponentIds = await matchOpponentsViaService(currentIdStr, 5); // try up to 5 candidates
+    if (!opponentIds) {
+      const allUsers = await User.find()
+        .select('_id name gender age preferences avatar')
+        .lean();
+      opponentIds = matchOpponents(currentIdStr, allUsers, 5);
+    }
 
     for (const opponentId of opponentIds) {
       const opponentUser = await User.findById(opponentId).select('name avatar').lean();
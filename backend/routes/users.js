@@ -2,6 +2,7 @@ const express = require('express');
 const path = require('path');
 const multer = require('multer');
 const User = require('../models/User');
+const { publishUserChange } = require('../services/opponentMatching');
 const jwt = require('jsonwebtoken');
 
 const router = express.Router();
@@ -55,6 +56,7 @@ const updatePreferencesHandler = async (req, res) => {
     if (!user) {
       return res.status(404).json({ message: 'User not found' });
     }
+    publishUserChange(user);
     return res.json({ user: toUserJson(user) });
   } catch (error) {
     console.error('Update preferences error:', error);
@@ -140,6 +142,7 @@ router.patch('/profile', auth, async (req, res) => {
     }
     const user = await User.findByIdAndUpdate(req.userId, update, { new: true }).select('-password');
     if (!user) return res.status(404).json({ message: 'User not found' });
+    publishUserChange(user);
     return res.json({ user: toUserJson(user) });
   } catch (error) {
     console.error('Update profile error:', error);
@@ -163,6 +166,7 @@ router.post('/profile', auth, async (req, res) => {
     }
     const user = await User.findByIdAndUpdate(req.userId, update, { new: true }).select('-password');
     if (!user) return res.status(404).json({ message: 'User not found' });
+    publishUserChange(user);
     return res.json({ user: toUserJson(user) });
   } catch (error) {
     console.error('Update profile error:', error);
@@ -4,6 +4,12 @@
  * Style has higher weight than gender and age (weighted Euclidean distance).
  */
 
+const axios = require('axios');
+
+// Python matcher service (backend/opponent_matching/matcher_service.py). Unset = scan locally.
+const MATCHER_SERVICE_URL = (process.env.MATCHER_SERVICE_URL || '').replace(/\/$/, '');
+const MATCHER_TIMEOUT_MS = 1500;
+
 // Same order as onboarding FASHION_PREFERENCES
 const STYLE_OPTIONS = [
   'Streetwear', 'Minimalist', 'Vintage', 'Sporty', 'Techwear',
@@ -81,8 +87,53 @@ function matchOpponents(currentUserId, users, k = 1) {
   return withDistance.slice(0, k).map(x => x.userId);
 }
 
+/**
+ * Ask the matcher service for up to k opponent ids (it keeps the index hot in memory).
+ * Resolves to null when the service is not configured, unreachable or does not know the user,
+ * so callers can fall back to matchOpponents over a local user scan.
+ * @param {string} currentUserId
+ * @param {number} k
+ * @returns {Promise<string[]|null>}
+ */
+async function matchOpponentsViaService(currentUserId, k = 1) {
+  if (!MATCHER_SERVICE_URL) return null;
+  try {
+    const { data } = await axios.post(
+      `${MATCHER_SERVICE_URL}/match`,
+      { user_id: String(currentUserId), k },
+      { timeout: MATCHER_TIMEOUT_MS }
+    );
+    return Array.isArray(data.opponents) ? data.opponents.map(String) : null;
+  } catch (error) {
+    console.error('Matcher service error:', error.message);
+    return null;
+  }
+}
+
+/**
+ * Tell the matcher service a user was created or changed (fire-and-forget).
+ * @param {{ _id: any, gender?: string, age?: number, preferences?: string[] }} user
+ */
+function publishUserChange(user) {
+  if (!MATCHER_SERVICE_URL || !user) return;
+  const event = {
+    type: 'upsert',
+    user: {
+      user_id: String(user._id),
+      gender: user.gender || '',
+      age: user.age ?? 25,
+      preferences: user.preferences || [],
+    },
+  };
+  axios
+    .post(`${MATCHER_SERVICE_URL}/users/events`, { events: [event] }, { timeout: MATCHER_TIMEOUT_MS })
+    .catch(error => console.error('Matcher service event error:', error.message));
+}
+
 module.exports = {
   matchOpponents,
+  matchOpponentsViaService,
+  publishUserChange,
   buildFeatureVector,
   getWeights,
   STYLE_OPTIONS,